@@ -9,7 +9,7 @@ import sys
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 
 from packages.shared.database import init_db
 from packages.shared.logger import setup_logging
@@ -59,7 +59,13 @@ def _validate_cors_config() -> list[str]:
 # Validate CORS configuration before app creation
 _cors_origins = _validate_cors_config()
 
-app = FastAPI(title='MailShieldAI Dashboard API', version='0.2.0')
+# orjson (already a dependency for the worker payloads) serializes responses;
+# list_emails pages carry analysis_result JSON blobs for every row
+app = FastAPI(
+    title='MailShieldAI Dashboard API',
+    version='0.2.0',
+    default_response_class=ORJSONResponse,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -74,7 +80,7 @@ app.add_middleware(
 async def global_exception_handler(request: Request, exc: Exception):
     """Global exception handler with CORS headers."""
     logger.error(f'Global exception: {exc}', exc_info=True)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={'detail': 'Internal Server Error', 'error': str(exc)},
         headers={
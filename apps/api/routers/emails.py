@@ -3,19 +3,22 @@ import json
 import logging
 import os
 import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
 from typing import Optional, Iterable
 
 from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import ORJSONResponse
+from googleapiclient.errors import HttpError
 from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 from starlette.concurrency import run_in_threadpool
-from google.oauth2.credentials import Credentials
 
 from apps.api.services.auth import get_current_user
-from apps.api.services.gmail import fetch_gmail_messages, GmailService
+from apps.api.services.gmail import fetch_gmail_messages, get_user_credentials, GmailService
 from apps.api.services.risk import evaluate_static_risk
 from packages.shared.constants import EmailStatus
-from packages.shared.database import get_session
+from packages.shared.database import async_session_maker, get_session
 from packages.shared.models import User, EmailEvent, EmailRead
 from packages.shared.queue import get_redis_client, EMAIL_INTENT_QUEUE, EMAIL_ANALYSIS_QUEUE, JOB_AGGREGATOR_QUEUE
 from packages.shared.types import BackgroundSyncRequest
@@ -26,11 +29,42 @@ downstream_tasks = []
 
 # Per-user sync locks to prevent concurrent sync operations
 _sync_locks: dict[uuid.UUID, asyncio.Lock] = {}
-
-
-async def email_exists(session: AsyncSession, message_id: str) -> bool:
-    result = await session.exec(select(EmailEvent).where(EmailEvent.message_id == message_id))
-    return result.first() is not None
+# Strong references to running sync tasks so they aren't garbage collected
+_sync_tasks: set[asyncio.Task] = set()
+# Latest sync outcome per user, polled by the dashboard (bounded, oldest evicted)
+SYNC_STATUS_USERS = 1000
+_sync_status: OrderedDict[uuid.UUID, dict] = OrderedDict()
+
+
+def set_sync_status(user_id: uuid.UUID, **sync_status) -> None:
+    _sync_status[user_id] = sync_status
+    _sync_status.move_to_end(user_id)
+    while len(_sync_status) > SYNC_STATUS_USERS:
+        _sync_status.popitem(last=False)
+
+# Gmail message IDs each user has already synced. Messages never change, so
+# the next sync doesn't download their full content again (bounded per user).
+KNOWN_MESSAGE_IDS_PER_USER = 1000
+_known_message_ids: dict[uuid.UUID, OrderedDict[str, None]] = {}
+
+
+def remember_message_ids(user_id: uuid.UUID, message_ids: Iterable[str]) -> None:
+    known = _known_message_ids.setdefault(user_id, OrderedDict())
+    for message_id in message_ids:
+        known[message_id] = None
+        known.move_to_end(message_id)
+    while len(known) > KNOWN_MESSAGE_IDS_PER_USER:
+        known.popitem(last=False)
+
+
+async def existing_message_ids(session: AsyncSession, message_ids: list[str]) -> set[str]:
+    """Return which of the given Gmail message IDs are already stored (one IN query)."""
+    if not message_ids:
+        return set()
+    result = await session.exec(
+        select(EmailEvent.message_id).where(EmailEvent.message_id.in_(message_ids))
+    )
+    return set(result.all())
 
 
 def build_email_event(
@@ -45,8 +79,6 @@ def build_email_event(
     CRITICAL: Control message (JOB_AGGREGATOR_QUEUE) MUST be published FIRST
     to establish job requirements before workers complete.
     """
-    from datetime import datetime, timezone
-    
     job_id = uuid.uuid4()
     job_id_str = str(job_id)
     downstream_tasks: list[tuple[str, dict]] = []
@@ -85,7 +117,7 @@ def build_email_event(
         'created_at': email.received_at.isoformat() if email.received_at else datetime.now(timezone.utc).isoformat(),
     }
     downstream_tasks.append((JOB_AGGREGATOR_QUEUE, control_payload))
-    logger.debug(f"Job {job_id_str}: Added control message with requiresB={should_sandbox}")
+    logger.debug("Job %s: Added control message with requiresB=%s", job_id_str, should_sandbox)
 
     # Intent analysis (always runs)
     # FIXED: Changed 'job_id' to 'email_id' to match worker expectations
@@ -95,7 +127,7 @@ def build_email_event(
         'body': email.body_text or email.body_html or '',
     }
     downstream_tasks.append((EMAIL_INTENT_QUEUE, intent_payload))
-    logger.debug(f"Job {job_id_str}: Added intent analysis task")
+    logger.debug("Job %s: Added intent analysis task", job_id_str)
 
     # Sandbox analysis (conditional)
     if should_sandbox:
@@ -107,9 +139,9 @@ def build_email_event(
             'attachment_metadata': json.dumps([att.model_dump_json() for att in email.attachments]),
         }
         downstream_tasks.append((EMAIL_ANALYSIS_QUEUE, sandbox_payload))
-        logger.debug(f"Job {job_id_str}: Added sandbox analysis task (risk evaluation triggered)")
+        logger.debug("Job %s: Added sandbox analysis task (risk evaluation triggered)", job_id_str)
     else:
-        logger.debug(f"Job {job_id_str}: Skipping sandbox analysis (low risk)")
+        logger.debug("Job %s: Skipping sandbox analysis (low risk)", job_id_str)
 
     logger.info(
         f"Job {job_id_str}: Created {len(downstream_tasks)} downstream tasks "
@@ -129,15 +161,21 @@ async def ingest_emails(
     """
     Deduplicate, persist emails, and enqueue downstream tasks.
     """
-    count = 0
     skipped = 0
+    new_events: list[EmailEvent] = []
     downstream_tasks: list[tuple[str, dict]] = []
 
+    emails = list(emails)
+    existing = await existing_message_ids(
+        session, [email.message_id for email in emails if email.message_id]
+    )
+
     for email in emails:
-        if await email_exists(session, email.message_id):
+        if email.message_id in existing:
             logger.debug('Email already exists: %s', email.message_id)
             skipped += 1
             continue
+        existing.add(email.message_id)
 
         email_event, tasks = build_email_event(
             user_id=user_id,
@@ -145,19 +183,25 @@ async def ingest_emails(
             status=status,
         )
 
-        session.add(email_event)
+        new_events.append(email_event)
         downstream_tasks.extend(tasks)
-        count += 1
 
+    count = len(new_events)
     if count == 0:
         logger.info('No new emails to ingest (skipped %d duplicate(s))', skipped)
         return 0
 
+    # One flush: SQLAlchemy batches the rows into multi-row INSERTs
+    session.add_all(new_events)
     await session.commit()
 
+    # One round trip for every downstream message; the pipeline keeps each
+    # job's control message ahead of its worker tasks
     redis = await get_redis_client()
-    for stream, payload in downstream_tasks:
-        await redis.xadd(stream, payload)
+    async with redis.pipeline(transaction=False) as pipe:
+        for stream, payload in downstream_tasks:
+            pipe.xadd(stream, payload)
+        await pipe.execute()
 
     logger.info(
         'Queued %s downstream tasks for %s new email(s) (skipped %d duplicate(s))',
@@ -171,6 +215,11 @@ async def ingest_emails(
 
 router = APIRouter()
 
+# Only the columns EmailRead exposes; rows are serialized straight from their
+# mappings, skipping ORM instance construction and the columns the response
+# drops anyway.
+EMAIL_READ_COLUMNS = tuple(getattr(EmailEvent, name) for name in EmailRead.model_fields)
+
 
 @router.get('', response_model=list[EmailRead])
 async def list_emails(
@@ -179,10 +228,15 @@ async def list_emails(
     offset: int = 0,
     user: User = Depends(get_current_user),
     session: AsyncSession = Depends(get_session),
-) -> list[EmailEvent]:
-    """List emails for the current user."""
+) -> ORJSONResponse:
+    """List emails for the current user.
+
+    The selected columns are exactly EmailRead's fields, so rows are encoded
+    by orjson directly instead of being re-validated into EmailRead first;
+    response_model still documents the schema.
+    """
     query = (
-        select(EmailEvent)
+        select(*EMAIL_READ_COLUMNS)
         .where(EmailEvent.user_id == user.id)
         .order_by(EmailEvent.received_at.desc())  # type: ignore
     )
@@ -191,14 +245,60 @@ async def list_emails(
     query = query.limit(limit).offset(offset)
 
     result = await session.exec(query)
-    return list(result.all())
+    return ORJSONResponse([dict(row._mapping) for row in result.all()])
+
+
+async def run_gmail_sync(user_id: uuid.UUID, google_token: str, lock: asyncio.Lock) -> None:
+    """
+    Fetch the user's latest Gmail messages and ingest them.
+
+    Runs outside the request with its own session, records the outcome for
+    GET /sync/status, and releases the per-user sync lock acquired by
+    sync_emails when done.
+    """
+    try:
+        gmail_emails = await asyncio.wait_for(
+            run_in_threadpool(
+                fetch_gmail_messages,
+                google_token,
+                20,
+                skip_ids=frozenset(_known_message_ids.get(user_id, ())),
+            ),
+            timeout=30.0,
+        )
+
+        logger.info('Starting email ingestion for user %s', user_id)
+        async with async_session_maker() as session:
+            count = await ingest_emails(
+                emails=gmail_emails,
+                user_id=user_id,
+                session=session,
+                status=EmailStatus.PENDING,
+            )
+        remember_message_ids(user_id, (email.message_id for email in gmail_emails))
+        logger.info('Completed email ingestion: %d new emails processed', count)
+        set_sync_status(user_id, status='completed', new_messages=count)
+
+    except asyncio.TimeoutError:
+        logger.error('Gmail sync timed out for user %s', user_id)
+        set_sync_status(user_id, status='failed', detail='Gmail sync timed out')
+    except HttpError as e:
+        logger.exception('Error syncing Gmail for user %s', user_id)
+        if e.resp.status in (401, 403):
+            set_sync_status(user_id, status='failed', detail='Gmail authorization failed')
+        else:
+            set_sync_status(user_id, status='failed', detail='Gmail sync failed')
+    except Exception:
+        logger.exception('Error syncing Gmail for user %s', user_id)
+        set_sync_status(user_id, status='failed', detail='Gmail sync failed')
+    finally:
+        lock.release()
 
 
 @router.post('/sync', status_code=status.HTTP_202_ACCEPTED)
 async def sync_emails(
     x_google_token: str = Header(..., alias='X-Google-Token'),
     user: User = Depends(get_current_user),
-    session: AsyncSession = Depends(get_session),
 ) -> dict:
     # Get or create lock for this user
     if user.id not in _sync_locks:
@@ -214,33 +314,26 @@ async def sync_emails(
             detail='Sync already in progress',
         )
 
-    async with lock:
-        try:
-            gmail_emails = await asyncio.wait_for(
-                run_in_threadpool(fetch_gmail_messages, x_google_token, 20),
-                timeout=30.0,
-            )
+    # Uncontended, so this returns without yielding; the sync task releases it
+    await lock.acquire()
+    set_sync_status(user.id, status='running')
 
-            logger.info('Starting email ingestion for user %s', user.id)
-            count = await ingest_emails(
-                emails=gmail_emails,
-                user_id=user.id,
-                session=session,
-                status=EmailStatus.PENDING,
-            )
-            logger.info('Completed email ingestion: %d new emails processed', count)
+    # Gmail latency no longer holds the request open. A task (rather than
+    # BackgroundTasks) always runs, even if the client disconnects before the
+    # response is sent, so the lock cannot be leaked.
+    task = asyncio.create_task(run_gmail_sync(user.id, x_google_token, lock))
+    _sync_tasks.add(task)
+    task.add_done_callback(_sync_tasks.discard)
 
-            return {
-                'status': 'synced',
-                'new_messages': count,
-            }
+    return {'status': 'queued'}
 
-        except Exception as e:
-            logger.exception('Error syncing Gmail')
-            raise HTTPException(
-                status_code=500,
-                detail='Gmail sync failed',
-            ) from e
+
+@router.get('/sync/status')
+async def sync_status(
+    user: User = Depends(get_current_user),
+) -> dict:
+    """Outcome of the user's latest sync: idle, running, completed or failed."""
+    return _sync_status.get(user.id, {'status': 'idle'})
 
 
 @router.post('/sync/background', status_code=status.HTTP_202_ACCEPTED)
@@ -270,14 +363,7 @@ async def sync_background(
             logger.error('Missing Google OAuth credentials')
             return {'status': 'error', 'reason': 'server_config_error'}
 
-        creds = Credentials(
-            token=None,
-            refresh_token=user.refresh_token,
-            token_uri='https://oauth2.googleapis.com/token',
-            client_id=client_id,
-            client_secret=client_secret,
-            scopes=['https://www.googleapis.com/auth/gmail.readonly'],
-        )
+        creds = await get_user_credentials(user.id, user.refresh_token, client_id, client_secret)
 
         service = GmailService(credentials=creds)
 
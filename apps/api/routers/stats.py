@@ -19,13 +19,7 @@ async def get_stats(
 ) -> dict:
     """Get email statistics for the current user."""
     
-    # Get total count directly from DB
-    total_result = await session.exec(
-        select(func.count()).select_from(EmailEvent).where(EmailEvent.user_id == user.id)
-    )
-    total_emails = total_result.one() or 0
-
-    # Get counts by risk tier using aggregation
+    # Count every tier in one aggregate; unanalyzed emails land in the NULL group
     tier_counts_result = await session.exec(
         select(EmailEvent.risk_tier, func.count())
         .where(EmailEvent.user_id == user.id)
@@ -33,12 +27,14 @@ async def get_stats(
     )
     
     # Initialize counters
+    total_emails = 0
     safe_count = 0
     cautious_count = 0
     threat_count = 0
     
     # Map DB results to counters
     for tier, count in tier_counts_result:
+        total_emails += count
         if tier:
             # tier is an Enum member, so we access .value
             if tier.value == "SAFE":
@@ -1,7 +1,11 @@
 
+import asyncio
+import hashlib
 import logging
 import os
 import sys
+import time
+from collections import OrderedDict
 
 from fastapi import Depends, Header, HTTPException, status
 from google.auth.transport import requests
@@ -22,8 +26,50 @@ if not GOOGLE_CLIENT_ID and not DEV_MODE:
     # This check happens at import time, usually fine for services
     logger.warning("AUTH_GOOGLE_ID environment variable is not set. Service may not function correctly in production.")
 
-def _verify_google_token(token: str) -> dict:
-    """Verify Google OAuth token and return payload."""
+# Verified ID token payloads keyed by a hash of the token, so repeat requests
+# skip the certificate fetch and signature check until the token nears expiry.
+# A TTL LRU: hits move to the end, and a full cache evicts the least recently used.
+TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "1024"))
+TOKEN_EXPIRY_LEEWAY = 30  # seconds; re-verify tokens this close to "exp"
+_verified_tokens: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+
+def _token_cache_key(token: str) -> str:
+    """Hash the token so raw bearer tokens are never kept in memory."""
+    return hashlib.blake2b(token.encode(), digest_size=16).hexdigest()
+
+
+def _get_cached_payload(key: str) -> dict | None:
+    """Return a cached payload that is still comfortably within its lifetime."""
+    entry = _verified_tokens.get(key)
+    if entry is None:
+        return None
+    expires_at, payload = entry
+    if expires_at - TOKEN_EXPIRY_LEEWAY <= time.time():
+        _verified_tokens.pop(key, None)
+        return None
+    _verified_tokens.move_to_end(key)
+    return payload
+
+
+def _cache_payload(key: str, payload: dict) -> None:
+    """Remember a verified payload until its "exp", keeping the cache bounded."""
+    expires_at = payload.get("exp")
+    if not isinstance(expires_at, (int, float)):
+        return
+
+    _verified_tokens[key] = (float(expires_at), payload)
+    _verified_tokens.move_to_end(key)
+    while len(_verified_tokens) > TOKEN_CACHE_SIZE:
+        _verified_tokens.popitem(last=False)
+
+
+async def _verify_google_token(token: str) -> dict:
+    """Verify Google OAuth token and return payload.
+
+    The blocking certificate fetch and signature check run in a worker
+    thread so they don't stall the event loop.
+    """
     if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token")
 
@@ -33,12 +79,19 @@ def _verify_google_token(token: str) -> dict:
             return {"sub": "dev-user-123", "email": "dev@example.com", "name": "Dev User"}
         logger.warning("Verifying Google token in DEV_MODE. Production checks apply.")
 
+    cache_key = _token_cache_key(token)
+    cached = _get_cached_payload(cache_key)
+    if cached is not None:
+        return cached
+
     try:
-        id_info = id_token.verify_oauth2_token(
-            token, 
-            requests.Request(), 
-            audience=GOOGLE_CLIENT_ID
+        id_info = await asyncio.to_thread(
+            id_token.verify_oauth2_token,
+            token,
+            requests.Request(),
+            audience=GOOGLE_CLIENT_ID,
         )
+        _cache_payload(cache_key, id_info)
         return id_info
     except ValueError as exc:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid Google token") from exc
@@ -73,7 +126,7 @@ async def get_current_user(
 ) -> User:
     """Get or create the current user from Google OAuth token."""
     token = _extract_bearer_token(authorization)
-    payload = _verify_google_token(token)
+    payload = await _verify_google_token(token)
     google_id: str | None = payload.get("sub")
     if not google_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Google token missing subject")
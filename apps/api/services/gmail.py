@@ -2,19 +2,26 @@
 Gmail Service
 """
 
+import asyncio
 import base64
+import json
 import logging
 import re
 import socket
 import time
+import uuid
+from collections import OrderedDict
 from datetime import datetime, timezone
 from email.utils import parsedate_to_datetime
-from typing import Optional
+from functools import lru_cache
+from typing import Collection, Optional
 
 import httplib2
 
+from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
 from googleapiclient.errors import HttpError
 from packages.shared.constants import EmailStatus
 
@@ -28,6 +35,42 @@ from packages.shared.types import (
 # --- Logging Setup ---
 logger = logging.getLogger(__name__)
 
+# Partial response for messages.get: only the fields _parse_message reads.
+# The full MIME payload is still needed for bodies, URLs and attachment metadata.
+MESSAGE_FIELDS = "id,snippet,labelIds,payload"
+# Gmail accepts at most 100 calls per batch request
+GMAIL_BATCH_LIMIT = 100
+
+GOOGLE_TOKEN_URI = "https://oauth2.googleapis.com/token"
+GMAIL_READONLY_SCOPES = ["https://www.googleapis.com/auth/gmail.readonly"]
+
+# --- User Credential Cache ---
+# Credentials minted from a user's refresh token are kept per user and only
+# refreshed once their access token is (about to be) expired. Bounded LRU:
+# the least recently used user is dropped once CREDENTIALS_CACHE_SIZE is reached,
+# and credentials whose refresh failed are dropped immediately.
+CREDENTIALS_CACHE_SIZE = 1000
+_credentials_cache: OrderedDict[uuid.UUID, Credentials] = OrderedDict()
+# Pending refresh task per user, so concurrent syncs share one OAuth round-trip.
+# The refresh runs in its own task: a caller being cancelled never cancels it.
+_refresh_inflight: dict[uuid.UUID, asyncio.Task] = {}
+
+
+@lru_cache(maxsize=1)
+def _gmail_discovery_document() -> dict:
+    """Parse the bundled Gmail v1 discovery document once per process."""
+    return json.loads(discovery_cache.get_static_doc("gmail", "v1"))
+
+
+def build_gmail_service(credentials: Credentials):
+    """
+    Build a Gmail API resource for the given credentials.
+
+    The resource itself is per user, but the discovery document behind it is
+    parsed only once instead of on every build("gmail", "v1").
+    """
+    return build_from_document(_gmail_discovery_document(), credentials=credentials)
+
 
 class EmailContentExtractor:
     """
@@ -54,49 +97,58 @@ class EmailContentExtractor:
 
     def walk_parts(self, part: dict) -> None:
         """
-        Recursively walk MIME parts to extract content.
+        Walk MIME parts to extract content.
+
+        Uses an explicit stack instead of recursion so deeply nested
+        multiparts cannot hit the recursion limit. Parts are still visited
+        depth-first in document order, so the first text/plain and text/html
+        bodies win exactly as before.
 
         Args:
             part: A Gmail payload part dictionary
         """
-        if not isinstance(part, dict):
-            return
-
-        mime_type = part.get("mimeType", "").lower()
-        body = part.get("body", {}) or {}
-        filename = part.get("filename")
-        data = body.get("data")
-
-        # 1. Handle attachments (metadata only, NOT content)
-        # Security: We never download attachment content to prevent malware execution
-        if filename and body.get("attachmentId"):
-            self.attachments.append(
-                AttachmentMetadata(
-                    filename=filename,
-                    mime_type=mime_type,
-                    size=body.get("size", 0),
-                    attachment_id=body.get("attachmentId"),
+        stack = [part]
+        while stack:
+            part = stack.pop()
+            if not isinstance(part, dict):
+                continue
+
+            mime_type = part.get("mimeType", "").lower()
+            body = part.get("body", {}) or {}
+            filename = part.get("filename")
+            data = body.get("data")
+
+            # 1. Handle attachments (metadata only, NOT content)
+            # Security: We never download attachment content to prevent malware execution
+            if filename and body.get("attachmentId"):
+                self.attachments.append(
+                    AttachmentMetadata(
+                        filename=filename,
+                        mime_type=mime_type,
+                        size=body.get("size", 0),
+                        attachment_id=body.get("attachmentId"),
+                    )
                 )
-            )
-            return  # Don't process attachment body
+                continue  # Don't process attachment body
 
-        # 2. Handle body content
-        if data and mime_type in ("text/plain", "text/html"):
-            decoded = decode_base64url(data)
+            # 2. Handle body content
+            if data and mime_type in ("text/plain", "text/html"):
+                decoded = decode_base64url(data)
 
-            if mime_type == "text/plain" and not self.text_body:
-                self.text_body = decoded
-                # Extract URLs from plain text
-                self.urls.update(extract_urls(decoded))
+                if mime_type == "text/plain" and not self.text_body:
+                    self.text_body = decoded
+                    # Extract URLs from plain text
+                    self.urls.update(extract_urls(decoded))
 
-            elif mime_type == "text/html" and not self.html_body:
-                self.html_body = decoded
-                # Extract URLs from HTML
-                self.urls.update(extract_urls(decoded))
+                elif mime_type == "text/html" and not self.html_body:
+                    self.html_body = decoded
+                    # Extract URLs from HTML
+                    self.urls.update(extract_urls(decoded))
 
-        # 3. Recurse into nested parts
-        for subpart in part.get("parts", []) or []:
-            self.walk_parts(subpart)
+            # 3. Queue nested parts, reversed so the first child is popped first
+            subparts = part.get("parts")
+            if subparts:
+                stack.extend(reversed(subparts))
 
     def extract(
         self, payload: dict
@@ -157,10 +209,10 @@ class GmailService:
         # Build the Gmail API service
         # Note: credentials and http are mutually exclusive in build()
         if credentials:
-            self.service = build("gmail", "v1", credentials=credentials)
+            self.service = build_gmail_service(credentials)
         elif access_token:
             creds = Credentials(token=access_token)
-            self.service = build("gmail", "v1", credentials=creds)
+            self.service = build_gmail_service(creds)
         else:
             raise ValueError("Either access_token or credentials must be provided")
 
@@ -180,8 +232,15 @@ class GmailService:
             payload = response.get("payload", {})
             headers = payload.get("headers", [])
 
-            # Build headers dict for easy lookup (case-insensitive)
-            headers_dict = {h["name"].lower(): h["value"] for h in headers}
+            # Build headers dict for easy lookup (case-insensitive), collecting
+            # the repeated Received headers in the same pass
+            headers_dict: dict[str, str] = {}
+            received_headers: list[str] = []
+            for h in headers:
+                name = h["name"].lower()
+                headers_dict[name] = h["value"]
+                if name == "received":
+                    received_headers.append(h["value"])
 
             # === Core Fields ===
             message_id = response.get("id", "unknown")
@@ -199,9 +258,6 @@ class GmailService:
             auth_status = parse_auth_results(auth_header)
 
             # === Security: Sender IP ===
-            received_headers = [
-                h["value"] for h in headers if h["name"].lower() == "received"
-            ]
             sender_ip = extract_sender_ip(received_headers)
 
             # === Content Extraction ===
@@ -233,8 +289,64 @@ class GmailService:
             logger.warning(f"Failed to parse message: {e}", exc_info=True)
             return None
 
+    def _fetch_messages(self, message_ids: list[str]) -> tuple[list[StructuredEmail], list[str]]:
+        """
+        Fetch and parse messages with batch requests of up to GMAIL_BATCH_LIMIT each.
+
+        Args:
+            message_ids: Gmail message IDs to fetch
+
+        Returns:
+            Tuple of (parsed emails, IDs of requests that failed)
+        """
+        email_data: list[StructuredEmail] = []
+        errors: list[str] = []
+
+        def batch_callback(request_id: str, response: dict, exception: Exception):
+            """Callback for each message in the batch request."""
+            if exception:
+                logger.error(f"Error fetching message {request_id}: {exception}")
+                errors.append(request_id)
+                return
+
+            parsed = self._parse_message(response)
+            if parsed:
+                email_data.append(parsed)
+
+        for start in range(0, len(message_ids), GMAIL_BATCH_LIMIT):
+            batch = self.service.new_batch_http_request(callback=batch_callback)
+            for msg_id in message_ids[start:start + GMAIL_BATCH_LIMIT]:
+                batch.add(
+                    self.service.users()
+                    .messages()
+                    .get(userId="me", id=msg_id, format="full", fields=MESSAGE_FIELDS)
+                )
+
+            # Execute batch with retry logic for rate limiting
+            max_retries = 3
+            for attempt in range(max_retries):
+                try:
+                    batch.execute()
+                    break  # Success, exit retry loop
+                except HttpError as e:
+                    if e.resp.status == 429 and attempt < max_retries - 1:
+                        # Rate limited, retry with exponential backoff
+                        wait_time = 2 ** attempt  # 1s, 2s, 4s
+                        logger.warning(
+                            f"Rate limited (429), retrying in {wait_time}s (attempt {attempt + 1}/{max_retries})"
+                        )
+                        time.sleep(wait_time)
+                    else:
+                        # Not a rate limit error, or out of retries
+                        raise
+
+        return email_data, errors
+
     def fetch_emails(
-        self, limit: int = 20, include_spam_trash: bool = True
+        self,
+        limit: int = 20,
+        include_spam_trash: bool = True,
+        skip_ids: Collection[str] = (),
     ) -> list[StructuredEmail]:
         """
         Fetch emails from Gmail using batch requests for performance.
@@ -245,6 +357,7 @@ class GmailService:
         Args:
             limit: Maximum number of emails to fetch (1-100)
             include_spam_trash: Whether to include SPAM and TRASH folders
+            skip_ids: Message IDs the caller already has; their content is not fetched
 
         Returns:
             List of StructuredEmail objects
@@ -269,6 +382,8 @@ class GmailService:
             )
 
             messages = results.get("messages", [])
+            if skip_ids:
+                messages = [msg for msg in messages if msg["id"] not in skip_ids]
             if not messages:
                 logger.info("No messages found")
                 return []
@@ -276,47 +391,7 @@ class GmailService:
             logger.info(f"Found {len(messages)} messages, fetching full content")
 
             # Step 2: Batch fetch full message content
-            email_data: list[StructuredEmail] = []
-            errors: list[str] = []
-
-            def batch_callback(request_id: str, response: dict, exception: Exception):
-                """Callback for each message in the batch request."""
-                if exception:
-                    logger.error(f"Error fetching message {request_id}: {exception}")
-                    errors.append(request_id)
-                    return
-
-                parsed = self._parse_message(response)
-                if parsed:
-                    email_data.append(parsed)
-
-            # Create batch request
-            batch = self.service.new_batch_http_request(callback=batch_callback)
-
-            for msg in messages:
-                batch.add(
-                    self.service.users()
-                    .messages()
-                    .get(userId="me", id=msg["id"], format="full")
-                )
-
-            # Execute batch with retry logic for rate limiting
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    batch.execute()
-                    break  # Success, exit retry loop
-                except HttpError as e:
-                    if e.resp.status == 429 and attempt < max_retries - 1:
-                        # Rate limited, retry with exponential backoff
-                        wait_time = 2 ** attempt  # 1s, 2s, 4s
-                        logger.warning(
-                            f"Rate limited (429), retrying in {wait_time}s (attempt {attempt + 1}/{max_retries})"
-                        )
-                        time.sleep(wait_time)
-                    else:
-                        # Not a rate limit error, or out of retries
-                        raise
+            email_data, errors = self._fetch_messages([msg["id"] for msg in messages])
 
             logger.info(
                 f"Fetched {len(email_data)} emails successfully, {len(errors)} errors",
@@ -375,41 +450,7 @@ class GmailService:
             logger.info(f"Found {len(message_ids)} new messages in history")
 
             # Step 3: Batch fetch the new messages
-            email_data: list[StructuredEmail] = []
-
-            def batch_callback(request_id: str, response: dict, exception: Exception):
-                if exception:
-                    logger.error(f"Error fetching message {request_id}: {exception}")
-                    return
-                parsed = self._parse_message(response)
-                if parsed:
-                    email_data.append(parsed)
-
-            batch = self.service.new_batch_http_request(callback=batch_callback)
-            for msg_id in message_ids:
-                batch.add(
-                    self.service.users()
-                    .messages()
-                    .get(userId="me", id=msg_id, format="full")
-                )
-
-            # Execute batch with retry logic for rate limiting
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    batch.execute()
-                    break  # Success, exit retry loop
-                except HttpError as e:
-                    if e.resp.status == 429 and attempt < max_retries - 1:
-                        # Rate limited, retry with exponential backoff
-                        wait_time = 2 ** attempt  # 1s, 2s, 4s
-                        logger.warning(
-                            f"Rate limited (429), retrying in {wait_time}s (attempt {attempt + 1}/{max_retries})"
-                        )
-                        time.sleep(wait_time)
-                    else:
-                        # Not a rate limit error, or out of retries
-                        raise
+            email_data, _ = self._fetch_messages(list(message_ids))
 
             return email_data
 
@@ -474,7 +515,7 @@ class GmailWatchService:
         socket.setdefaulttimeout(timeout)
 
         creds = Credentials(token=access_token)
-        self.service = build("gmail", "v1", credentials=creds)
+        self.service = build_gmail_service(creds)
 
         logger.info(
             "GmailWatchService initialized",
@@ -594,6 +635,28 @@ class GmailWatchService:
             raise
 
 
+# mechanism=result pairs in an Authentication-Results header (e.g. "spf=pass")
+_AUTH_RESULT_RE = re.compile(r"(spf|dkim|dmarc)=(pass|softfail|fail|neutral|none)", re.IGNORECASE)
+# Status precedence when a header carries several results for one mechanism
+_SPF_PRECEDENCE = (
+    ({"pass"}, "PASS"),
+    ({"fail", "softfail"}, "FAIL"),
+    ({"neutral"}, "NEUTRAL"),
+    ({"none"}, "NONE"),
+)
+_DKIM_PRECEDENCE = (
+    ({"pass"}, "PASS"),
+    ({"fail"}, "FAIL"),
+    ({"neutral"}, "NEUTRAL"),
+    ({"none"}, "NONE"),
+)
+_DMARC_PRECEDENCE = (
+    ({"pass"}, "PASS"),
+    ({"fail"}, "FAIL"),
+    ({"none"}, "NONE"),
+)
+
+
 def parse_auth_results(auth_results: str) -> EmailAuthenticationStatus:
     """
     Parse the Authentication-Results header to extract SPF, DKIM, DMARC status.
@@ -615,45 +678,37 @@ def parse_auth_results(auth_results: str) -> EmailAuthenticationStatus:
     """
     result = EmailAuthenticationStatus()
 
-    if not auth_results:
+    # Without "=" there is no mechanism=result pair to find
+    if not auth_results or "=" not in auth_results:
         return result
 
-    auth_lower = auth_results.lower()
-
-    # SPF (Sender Policy Framework)
-    # Checks if the sending server's IP is authorized to send for the domain
-    if "spf=pass" in auth_lower:
-        result.spf = "PASS"
-    elif "spf=fail" in auth_lower or "spf=softfail" in auth_lower:
-        result.spf = "FAIL"
-    elif "spf=neutral" in auth_lower:
-        result.spf = "NEUTRAL"
-    elif "spf=none" in auth_lower:
-        result.spf = "NONE"
-
-    # DKIM (DomainKeys Identified Mail)
-    # Cryptographic signature to verify email wasn't tampered with
-    if "dkim=pass" in auth_lower:
-        result.dkim = "PASS"
-    elif "dkim=fail" in auth_lower:
-        result.dkim = "FAIL"
-    elif "dkim=neutral" in auth_lower:
-        result.dkim = "NEUTRAL"
-    elif "dkim=none" in auth_lower:
-        result.dkim = "NONE"
-
-    # DMARC (Domain-based Message Authentication)
-    # Policy layer that combines SPF and DKIM with domain alignment
-    if "dmarc=pass" in auth_lower:
-        result.dmarc = "PASS"
-    elif "dmarc=fail" in auth_lower:
-        result.dmarc = "FAIL"
-    elif "dmarc=none" in auth_lower:
-        result.dmarc = "NONE"
+    # One scan collects every mechanism=result pair in the header
+    seen: dict[str, set[str]] = {"spf": set(), "dkim": set(), "dmarc": set()}
+    for mechanism, verdict in _AUTH_RESULT_RE.findall(auth_results):
+        seen[mechanism.lower()].add(verdict.lower())
+
+    # SPF: is the sending server's IP authorized to send for the domain
+    # DKIM: cryptographic signature to verify email wasn't tampered with
+    # DMARC: policy layer that combines SPF and DKIM with domain alignment
+    result.spf = _first_auth_status(seen["spf"], _SPF_PRECEDENCE)
+    result.dkim = _first_auth_status(seen["dkim"], _DKIM_PRECEDENCE)
+    result.dmarc = _first_auth_status(seen["dmarc"], _DMARC_PRECEDENCE)
 
     return result
 
 
+def _first_auth_status(verdicts: set[str], precedence: tuple) -> Optional[str]:
+    """Return the status of the highest-precedence verdict present, if any."""
+    for candidates, status in precedence:
+        if not verdicts.isdisjoint(candidates):
+            return status
+    return None
+
+
+# IPv4 address in square brackets (common Received header format)
+_RECEIVED_IP_RE = re.compile(r"\[(\d{1,3}(?:\.\d{1,3}){3})\]")
+
+
 def extract_sender_ip(received_headers: list[str]) -> Optional[str]:
     """
     Extract the originating sender IP from Received headers.
@@ -673,11 +728,8 @@ def extract_sender_ip(received_headers: list[str]) -> Optional[str]:
     Returns:
         IP address string or None if not found
     """
-    # IPv4 pattern in square brackets (common format)
-    ipv4_pattern = re.compile(r"\[(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\]")
-
     for received in reversed(received_headers):
-        match = ipv4_pattern.search(received)
+        match = _RECEIVED_IP_RE.search(received)
         if match:
             ip = match.group(1)
             # Skip private/local IPs as they're not the actual sender
@@ -709,7 +761,7 @@ def decode_base64url(data: str) -> str:
         decoded = base64.urlsafe_b64decode(data + padding)
         return decoded.decode("utf-8", errors="replace")
     except Exception as e:
-        logger.debug(f"Base64 decode failed: {e}")
+        logger.debug("Base64 decode failed: %s", e)
         return ""
 
 
@@ -736,7 +788,7 @@ def parse_email_date(date_str: str) -> Optional[datetime]:
         # Convert to UTC and remove timezone info for database storage
         return dt.astimezone(timezone.utc).replace(tzinfo=None)
     except Exception as e:
-        logger.debug(f"Date parse failed for '{date_str}': {e}")
+        logger.debug("Date parse failed for '%s': %s", date_str, e)
         return None
 
 
@@ -778,6 +830,7 @@ def fetch_gmail_messages(
     access_token: str,
     limit: int,
     trace_context: str | None = None,
+    skip_ids: Collection[str] = (),
 ):
     """
     Thin sync wrapper so GmailService can run in a thread pool.
@@ -786,7 +839,70 @@ def fetch_gmail_messages(
         access_token=access_token,
         trace_context=trace_context,
     )
-    return service.fetch_emails(limit=limit)
+    return service.fetch_emails(limit=limit, skip_ids=skip_ids)
+
+
+async def get_user_credentials(
+    user_id: uuid.UUID,
+    refresh_token: str,
+    client_id: str,
+    client_secret: str,
+) -> Credentials:
+    """
+    Return Gmail read-only credentials for a user with a valid access token.
+
+    The cached access token is reused while google-auth still considers it
+    valid (it expires them a few minutes early); otherwise it is refreshed once,
+    with concurrent callers for the same user awaiting that single refresh.
+
+    Args:
+        user_id: User the refresh token belongs to (cache key)
+        refresh_token: User's stored OAuth refresh token
+        client_id: OAuth client ID
+        client_secret: OAuth client secret
+
+    Returns:
+        Credentials with a non-expired access token
+    """
+    creds = _credentials_cache.get(user_id)
+    if creds is None or creds.refresh_token != refresh_token:
+        creds = Credentials(
+            token=None,
+            refresh_token=refresh_token,
+            token_uri=GOOGLE_TOKEN_URI,
+            client_id=client_id,
+            client_secret=client_secret,
+            scopes=GMAIL_READONLY_SCOPES,
+        )
+        _credentials_cache[user_id] = creds
+    _credentials_cache.move_to_end(user_id)
+    while len(_credentials_cache) > CREDENTIALS_CACHE_SIZE:
+        _credentials_cache.popitem(last=False)
+
+    if creds.valid:
+        return creds
+
+    task = _refresh_inflight.get(user_id)
+    if task is None:
+        task = asyncio.create_task(_refresh_credentials(user_id, creds))
+        _refresh_inflight[user_id] = task
+        task.add_done_callback(lambda _: _refresh_inflight.pop(user_id, None))
+
+    return await asyncio.shield(task)
+
+
+async def _refresh_credentials(user_id: uuid.UUID, creds: Credentials) -> Credentials:
+    """Refresh a user's access token off the event loop."""
+    try:
+        await asyncio.to_thread(creds.refresh, Request())
+    except Exception:
+        # Don't keep credentials that can't refresh (e.g. a revoked grant);
+        # leave the entry alone if newer credentials already replaced it
+        if _credentials_cache.get(user_id) is creds:
+            del _credentials_cache[user_id]
+        raise
+    logger.info("Refreshed Gmail access token for user %s (expires %s)", user_id, creds.expiry)
+    return creds
 
 
 async def setup_gmail_push_for_user(
@@ -0,0 +1,97 @@
+"""
+Unit Tests for the verified Google token cache.
+
+Tests:
+- A verified token is reused until it nears expiry
+- Tokens close to expiry are verified again
+- Rejected tokens are never cached
+- A full cache evicts the least recently used token
+
+Run with: PYTHONPATH=. python apps/api/services/test_auth.py
+(DATABASE_URL must be set, e.g. sqlite+aiosqlite:///./test.db)
+"""
+
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+
+
+def _payload(expires_in: float) -> dict:
+    return {"sub": "google-123", "email": "user@example.com", "exp": time.time() + expires_in}
+
+
+def test_verified_token_is_reused():
+    from apps.api.services import auth
+
+    auth._verified_tokens.clear()
+    with patch.object(auth.id_token, "verify_oauth2_token", return_value=_payload(3600)) as verify:
+        first = asyncio.run(auth._verify_google_token("token-a"))
+        second = asyncio.run(auth._verify_google_token("token-a"))
+
+    assert verify.call_count == 1
+    assert second is first
+    # The raw token is never used as the cache key
+    assert "token-a" not in auth._verified_tokens
+
+    auth._verified_tokens.clear()
+    print("✅ Token reuse test passed")
+
+
+def test_token_near_expiry_is_reverified():
+    from apps.api.services import auth
+
+    auth._verified_tokens.clear()
+    with patch.object(auth.id_token, "verify_oauth2_token", return_value=_payload(5)) as verify:
+        asyncio.run(auth._verify_google_token("token-b"))
+        asyncio.run(auth._verify_google_token("token-b"))
+
+    assert verify.call_count == 2
+
+    auth._verified_tokens.clear()
+    print("✅ Expiry leeway test passed")
+
+
+def test_rejected_token_is_not_cached():
+    from apps.api.services import auth
+
+    auth._verified_tokens.clear()
+    with patch.object(auth.id_token, "verify_oauth2_token", side_effect=ValueError("bad signature")) as verify:
+        for _ in range(2):
+            with pytest.raises(HTTPException):
+                asyncio.run(auth._verify_google_token("token-c"))
+
+    assert verify.call_count == 2
+    assert not auth._verified_tokens
+    print("✅ Rejected token test passed")
+
+
+def test_full_cache_evicts_least_recently_used():
+    from apps.api.services import auth
+
+    auth._verified_tokens.clear()
+    with patch.object(auth, "TOKEN_CACHE_SIZE", 2), \
+            patch.object(auth.id_token, "verify_oauth2_token", return_value=_payload(3600)) as verify:
+        asyncio.run(auth._verify_google_token("hot"))
+        asyncio.run(auth._verify_google_token("cold"))
+        # A hit makes "hot" the most recently used, so "cold" is evicted next
+        asyncio.run(auth._verify_google_token("hot"))
+        asyncio.run(auth._verify_google_token("new"))
+        assert verify.call_count == 3
+
+        asyncio.run(auth._verify_google_token("hot"))
+        assert verify.call_count == 3
+        asyncio.run(auth._verify_google_token("cold"))
+        assert verify.call_count == 4
+
+    auth._verified_tokens.clear()
+    print("✅ LRU eviction test passed")
+
+
+if __name__ == "__main__":
+    test_verified_token_is_reused()
+    test_token_near_expiry_is_reverified()
+    test_rejected_token_is_not_cached()
+    test_full_cache_evicts_least_recently_used()
@@ -0,0 +1,146 @@
+"""
+Unit Tests for the per-user Gmail credential cache.
+
+Tests:
+- Concurrent callers share a single token refresh
+- Refresh errors reach every waiting caller
+- Cancelling one caller does not cancel the shared refresh
+- The cache is bounded and least recently used users are evicted
+
+Run with: PYTHONPATH=. python apps/api/services/test_gmail_credentials.py
+"""
+
+import asyncio
+import datetime
+import threading
+import time
+import uuid
+from unittest.mock import patch
+
+import pytest
+
+
+def _fake_refresh(calls, delay=0.05, error=None):
+    def refresh(self, request):
+        calls.append(threading.get_ident())
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        self.token = "access-token"
+        self.expiry = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+
+    return refresh
+
+
+def test_concurrent_callers_share_one_refresh():
+    from google.oauth2.credentials import Credentials
+    from apps.api.services.gmail import _credentials_cache, get_user_credentials
+
+    calls = []
+    user_id = uuid.uuid4()
+
+    async def run():
+        return await asyncio.gather(
+            *(get_user_credentials(user_id, "refresh", "id", "secret") for _ in range(10))
+        )
+
+    with patch.object(Credentials, "refresh", _fake_refresh(calls)):
+        results = asyncio.run(run())
+
+    assert len(calls) == 1
+    assert all(creds is results[0] for creds in results)
+    assert results[0].token == "access-token"
+
+    # A valid cached token is reused without another refresh
+    with patch.object(Credentials, "refresh", _fake_refresh(calls)):
+        asyncio.run(get_user_credentials(user_id, "refresh", "id", "secret"))
+    assert len(calls) == 1
+
+    _credentials_cache.pop(user_id, None)
+    print("✅ Shared refresh test passed")
+
+
+def test_refresh_error_reaches_every_caller():
+    from google.auth.exceptions import RefreshError
+    from google.oauth2.credentials import Credentials
+    from apps.api.services.gmail import _credentials_cache, _refresh_inflight, get_user_credentials
+
+    calls = []
+    user_id = uuid.uuid4()
+
+    async def run():
+        return await asyncio.gather(
+            *(get_user_credentials(user_id, "refresh", "id", "secret") for _ in range(3)),
+            return_exceptions=True,
+        )
+
+    with patch.object(Credentials, "refresh", _fake_refresh(calls, error=RefreshError("revoked"))):
+        results = asyncio.run(run())
+
+    assert len(calls) == 1
+    assert all(isinstance(r, RefreshError) for r in results)
+    # A failed refresh is not left behind for later callers
+    assert user_id not in _refresh_inflight
+    # Nor are the credentials that failed to refresh
+    assert user_id not in _credentials_cache
+
+    _credentials_cache.pop(user_id, None)
+    print("✅ Refresh error propagation test passed")
+
+
+def test_cancelled_caller_does_not_cancel_refresh():
+    from google.oauth2.credentials import Credentials
+    from apps.api.services.gmail import _credentials_cache, get_user_credentials
+
+    calls = []
+    user_id = uuid.uuid4()
+
+    async def run():
+        first = asyncio.create_task(get_user_credentials(user_id, "refresh", "id", "secret"))
+        second = asyncio.create_task(get_user_credentials(user_id, "refresh", "id", "secret"))
+        await asyncio.sleep(0.01)
+
+        # The caller that started the refresh goes away
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+        return await second
+
+    with patch.object(Credentials, "refresh", _fake_refresh(calls)):
+        creds = asyncio.run(run())
+
+    assert len(calls) == 1
+    assert creds.token == "access-token"
+
+    _credentials_cache.pop(user_id, None)
+    print("✅ Cancellation test passed")
+
+
+def test_cache_evicts_least_recently_used_user():
+    from google.oauth2.credentials import Credentials
+    from apps.api.services import gmail
+
+    calls = []
+    hot, cold, new = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+
+    async def run():
+        for user_id in (hot, cold, hot, new):
+            await gmail.get_user_credentials(user_id, "refresh", "id", "secret")
+
+    with patch.object(gmail, "CREDENTIALS_CACHE_SIZE", 2), \
+            patch.object(Credentials, "refresh", _fake_refresh(calls, delay=0)):
+        asyncio.run(run())
+
+    assert list(gmail._credentials_cache) == [hot, new]
+
+    for user_id in (hot, new):
+        gmail._credentials_cache.pop(user_id, None)
+    print("✅ Credential cache bound test passed")
+
+
+if __name__ == "__main__":
+    test_concurrent_callers_share_one_refresh()
+    test_refresh_error_reaches_every_caller()
+    test_cancelled_caller_does_not_cancel_refresh()
+    test_cache_evicts_least_recently_used_user()
@@ -11,7 +11,7 @@ import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/com
 import { Input } from "@/components/ui/input"
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select"
 import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from "@/components/ui/table"
-import { type Email, fetchEmails, syncEmails } from "@/lib/api"
+import { type Email, fetchEmails, syncEmails, waitForSync } from "@/lib/api"
 
 const tierColor: Record<string, string> = {
   SAFE: "text-green-500 bg-green-500/10",
@@ -82,8 +82,17 @@ export function EmailsPage() {
         // Trigger sync only once per session mount
         if (session.accessToken && !syncedRef.current) {
           syncedRef.current = true
-          // Fire and forget sync, don't block UI
-          syncEmails(session.idToken, session.accessToken).catch(console.error)
+          // Don't block UI on the sync; reload once it has stored new messages
+          const idToken = session.idToken
+          syncEmails(idToken, session.accessToken)
+            .then(() => waitForSync(idToken))
+            .then(async (syncStatus) => {
+              if (syncStatus.new_messages && active) {
+                const data = await fetchEmails(idToken)
+                if (active) setEmails(data)
+              }
+            })
+            .catch(console.error)
         }
 
         // Fetch emails (uses cache if available)
@@ -116,8 +125,9 @@ export function EmailsPage() {
 
     setRefreshing(true)
     try {
-      // Clear cache and sync fresh data
+      // Sync fresh data and wait for it to land before reloading
       await syncEmails(session.idToken, session.accessToken)
+      await waitForSync(session.idToken)
       const data = await fetchEmails(session.idToken)
       setEmails(data)
     } catch (err) {
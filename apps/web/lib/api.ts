@@ -10,6 +10,15 @@ type FetchOptions = {
   body?: unknown
 }
 
+export class ApiError extends Error {
+  status: number
+
+  constructor(message: string, status: number) {
+    super(message)
+    this.status = status
+  }
+}
+
 async function request<T>(path: string, { token, headers, method = "GET", body }: FetchOptions = {}): Promise<T> {
   const res = await fetch(`${API_URL}${path}`, {
     method,
@@ -32,7 +41,7 @@ async function request<T>(path: string, { token, headers, method = "GET", body }
         // Ignore parsing errors
       }
     }
-    throw new Error(errorMessage)
+    throw new ApiError(errorMessage, res.status)
   }
 
   return res.json() as Promise<T>
@@ -75,10 +84,48 @@ export async function fetchEmails(token: string): Promise<Email[]> {
 
 
 
-export async function syncEmails(token: string, googleToken: string): Promise<{ status: string, new_messages: number }> {
-  return request("/api/emails/sync", {
-    token,
-    headers: { "X-Google-Token": googleToken },
-    method: "POST"
-  })
+export async function syncEmails(token: string, googleToken: string): Promise<{ status: string }> {
+  try {
+    return await request<{ status: string }>("/api/emails/sync", {
+      token,
+      headers: { "X-Google-Token": googleToken },
+      method: "POST"
+    })
+  } catch (err) {
+    // Another tab or the dashboard layout already started a sync; callers can
+    // wait on that one through waitForSync
+    if (err instanceof ApiError && err.status === 409) {
+      return { status: "running" }
+    }
+    throw err
+  }
+}
+
+export type SyncStatus = {
+  status: "idle" | "running" | "completed" | "failed"
+  new_messages?: number
+  detail?: string
+}
+
+export async function fetchSyncStatus(token: string): Promise<SyncStatus> {
+  return request<SyncStatus>("/api/emails/sync/status", { token })
+}
+
+// Sync runs in the background on the API; poll until it settles so callers
+// only reload emails once the new messages are stored
+export async function waitForSync(token: string, { intervalMs = 1000, timeoutMs = 45000 } = {}): Promise<SyncStatus> {
+  const deadline = Date.now() + timeoutMs
+  for (;;) {
+    const syncStatus = await fetchSyncStatus(token)
+    if (syncStatus.status === "failed") {
+      throw new Error(syncStatus.detail ?? "Gmail sync failed")
+    }
+    if (syncStatus.status !== "running") {
+      return syncStatus
+    }
+    if (Date.now() >= deadline) {
+      throw new Error("Gmail sync is taking longer than expected")
+    }
+    await new Promise((resolve) => setTimeout(resolve, intervalMs))
+  }
 }
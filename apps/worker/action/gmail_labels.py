@@ -5,20 +5,46 @@ Handles:
 - Creating MailShield labels if they don't exist
 - Applying labels to messages based on security verdicts
 - Handling race conditions during label creation
+
+All calls go through a shared httpx.AsyncClient whose base_url is GMAIL_API_URL
+and whose auth attaches the OAuth bearer token, so connections are kept alive
+across messages and no thread-pool hop is needed.
 """
 
 import logging
-import asyncio
+from dataclasses import dataclass, field
 from typing import Optional
-from googleapiclient.discovery import Resource
-from googleapiclient.errors import HttpError
+
+import httpx
 
 logger = logging.getLogger(__name__)
 
+# Gmail REST endpoint for the authenticated user (base_url of the shared client)
+GMAIL_API_URL = "https://gmail.googleapis.com/gmail/v1/users/me"
+
 # Label cache to avoid repeated API calls
 # Maps label_name -> label_id
 _label_cache: dict[str, str] = {}
 
+# Cross-process label cache (Redis hash: label_name -> label_id)
+# Lets every worker replica skip the labels().list() round-trip once any of them has resolved a label
+LABEL_CACHE_KEY = "gmail:labels"
+LABEL_CACHE_TTL = 24 * 60 * 60  # 24 hours
+
+# HTTP statuses a modify/batchModify may return when a cached label ID no longer
+# exists. They are also returned for bad message IDs, so a label is only treated
+# as stale after labels.get confirms it is gone (see _label_exists).
+STALE_LABEL_STATUSES = (400, 404)
+
+# Statuses with which Gmail rejects a bad/deleted message ID. A batchModify fails as a
+# whole on one such ID, so the batch is bisected to isolate it.
+REJECTED_MESSAGE_STATUSES = (400, 404)
+
+# Per-label Redis sets of message IDs already labeled, so retries and
+# redeliveries skip the Gmail call entirely
+LABELED_KEY_PREFIX = "labeled:"
+LABELED_TTL = 30 * 24 * 60 * 60
+
 # MailShield label definitions
 MAILSHIELD_LABELS = {
     "MailShield/MALICIOUS": {
@@ -50,26 +76,45 @@ VERDICT_TO_LABEL = {
 }
 
 
-def _fetch_label_blocking(service: Resource, label_name: str) -> Optional[str]:
+async def _list_labels(client: httpx.AsyncClient) -> Optional[dict[str, str]]:
     """
-    Fetch a label ID by name (blocking call).
-    Returns label_id if found, None otherwise.
+    List all labels in the mailbox with a single labels.list call.
+    Returns a dict mapping label names to IDs, or None on failure.
     """
     try:
-        result = service.users().labels().list(userId='me').execute()
-        labels = result.get('labels', [])
-        for label in labels:
-            if label['name'] == label_name:
-                return label['id']
-        return None
-    except HttpError as e:
+        response = await client.get("/labels")
+        response.raise_for_status()
+        return {label['name']: label['id'] for label in response.json().get('labels', [])}
+    except httpx.HTTPError as e:
         logger.error(f"Failed to list labels: {e}")
         return None
 
 
-def _create_label_blocking(service: Resource, label_name: str) -> Optional[str]:
+async def _fetch_label(client: httpx.AsyncClient, label_name: str) -> Optional[str]:
+    """
+    Fetch a label ID by name.
+    Returns label_id if found, None otherwise.
+    """
+    labels = await _list_labels(client)
+    return labels.get(label_name) if labels else None
+
+
+async def _label_exists(client: httpx.AsyncClient, label_id: str) -> bool:
     """
-    Create a new Gmail label (blocking call).
+    Confirm a cached label ID still exists with labels.get.
+    Only a 404 counts as gone; other errors keep the cached ID.
+    """
+    try:
+        response = await client.get(f"/labels/{label_id}")
+    except httpx.HTTPError as e:
+        logger.warning(f"Could not verify label {label_id}: {e}")
+        return True
+    return response.status_code != 404
+
+
+async def _create_label(client: httpx.AsyncClient, label_name: str) -> Optional[str]:
+    """
+    Create a new Gmail label.
     Returns the new label_id, or None on failure.
     Handles 409 Conflict (label already exists) gracefully.
     """
@@ -80,30 +125,41 @@ def _create_label_blocking(service: Resource, label_name: str) -> Optional[str]:
     })
     
     try:
-        result = service.users().labels().create(
-            userId='me',
-            body=label_config
-        ).execute()
-        label_id = result.get('id')
-        logger.info(f"Created label '{label_name}' with ID: {label_id}")
-        return label_id
-    except HttpError as e:
-        if e.resp.status == 409:
+        response = await client.post("/labels", json=label_config)
+        if response.status_code == 409:
             # Label already exists (race condition with another process)
             logger.warning(f"Label '{label_name}' already exists (409 Conflict). Fetching ID...")
-            return _fetch_label_blocking(service, label_name)
+            return await _fetch_label(client, label_name)
+        response.raise_for_status()
+        label_id = response.json().get('id')
+        logger.info(f"Created label '{label_name}' with ID: {label_id}")
+        return label_id
+    except httpx.HTTPError as e:
         logger.error(f"Failed to create label '{label_name}': {e}")
         return None
 
 
-async def get_or_create_label(service: Resource, label_name: str) -> Optional[str]:
+async def _remember_labels(labels: dict[str, str], redis=None) -> None:
+    """Store label IDs in the in-process cache and, if provided, in Redis."""
+    if not labels:
+        return
+    _label_cache.update(labels)
+    if redis is not None:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.hset(LABEL_CACHE_KEY, mapping=labels)
+            pipe.expire(LABEL_CACHE_KEY, LABEL_CACHE_TTL)
+            await pipe.execute()
+
+
+async def get_or_create_label(client: httpx.AsyncClient, label_name: str, redis=None) -> Optional[str]:
     """
     Get a label ID by name, creating it if it doesn't exist.
-    Uses an in-memory cache to minimize API calls.
+    Uses an in-memory cache (and Redis, if provided) to minimize API calls.
     
     Args:
-        service: Gmail API service resource
+        client: Shared Gmail HTTP client
         label_name: Full label name (e.g., "MailShield/MALICIOUS")
+        redis: Optional async Redis client for the cross-process label cache
         
     Returns:
         Label ID string, or None if creation failed
@@ -111,140 +167,292 @@ async def get_or_create_label(service: Resource, label_name: str) -> Optional[st
     # Check cache first
     if label_name in _label_cache:
         return _label_cache[label_name]
-    
-    # Run blocking calls in thread pool
-    loop = asyncio.get_running_loop()
+
+    if redis is not None:
+        label_id = await redis.hget(LABEL_CACHE_KEY, label_name)
+        if label_id:
+            _label_cache[label_name] = label_id
+            return label_id
     
     # Try to fetch existing label
-    label_id = await loop.run_in_executor(
-        None, _fetch_label_blocking, service, label_name
-    )
+    label_id = await _fetch_label(client, label_name)
     
     if not label_id:
         # Create the label
-        label_id = await loop.run_in_executor(
-            None, _create_label_blocking, service, label_name
-        )
+        label_id = await _create_label(client, label_name)
     
     if label_id:
-        _label_cache[label_name] = label_id
+        await _remember_labels({label_name: label_id}, redis)
         
     return label_id
 
 
-async def ensure_labels_exist(service: Resource) -> dict[str, str]:
+async def invalidate_label(label_name: str, redis=None) -> None:
+    """
+    Drop a cached label ID (e.g. after the label was deleted in Gmail).
+    
+    Args:
+        label_name: Full label name (e.g., "MailShield/MALICIOUS")
+        redis: Optional async Redis client for the cross-process label cache
+    """
+    _label_cache.pop(label_name, None)
+    if redis is not None:
+        await redis.hdel(LABEL_CACHE_KEY, label_name)
+
+
+async def ensure_labels_exist(client: httpx.AsyncClient, redis=None) -> dict[str, str]:
     """
     Pre-create all MailShield labels at agent startup.
     This avoids race conditions when processing multiple emails.
     
     Args:
-        service: Gmail API service resource
+        client: Shared Gmail HTTP client
+        redis: Optional async Redis client for the cross-process label cache
         
     Returns:
         Dict mapping label names to their IDs
     """
-    results = {}
+    # One labels.list call covers every label that already exists
+    existing = await _list_labels(client) or {}
+    results = {name: existing[name] for name in MAILSHIELD_LABELS if name in existing}
+
     for label_name in MAILSHIELD_LABELS:
-        label_id = await get_or_create_label(service, label_name)
+        if label_name in results:
+            continue
+        label_id = await _create_label(client, label_name)
         if label_id:
             results[label_name] = label_id
         else:
             logger.error(f"Failed to ensure label exists: {label_name}")
+
+    await _remember_labels(results, redis)
     
     logger.info(f"Ensured {len(results)}/{len(MAILSHIELD_LABELS)} MailShield labels exist")
     return results
 
 
-def _modify_message_blocking(
-    service: Resource,
-    message_id: str,
+# Gmail accepts at most 1000 message IDs per batchModify request
+BATCH_MODIFY_LIMIT = 1000
+
+
+async def _batch_modify_messages(
+    client: httpx.AsyncClient,
+    message_ids: list[str],
     add_label_ids: list[str],
     remove_label_ids: Optional[list[str]] = None
-) -> bool:
+) -> None:
     """
-    Modify message labels (blocking call).
+    Modify labels on many messages with a single batchModify call.
     
     Args:
-        service: Gmail API service
-        message_id: Gmail message ID
+        client: Shared Gmail HTTP client
+        message_ids: Gmail message IDs (at most BATCH_MODIFY_LIMIT)
         add_label_ids: List of label IDs to add
         remove_label_ids: Optional list of label IDs to remove
         
-    Returns:
-        True on success, False on failure
+    Raises:
+        httpx.HTTPStatusError: If the Gmail API rejects the modification
     """
-    body = {"addLabelIds": add_label_ids}
+    body = {"ids": message_ids, "addLabelIds": add_label_ids}
     if remove_label_ids:
         body["removeLabelIds"] = remove_label_ids
     
+    response = await client.post("/messages/batchModify", json=body)
+    response.raise_for_status()
+
+
+@dataclass
+class BatchLabelResult:
+    """Outcome of labeling a group of messages."""
+
+    labeled: list[str] = field(default_factory=list)
+    # Rejected by Gmail for the message itself (deleted, invalid ID): never retried
+    rejected: list[str] = field(default_factory=list)
+    # Not labeled because of a transient or label-level error: retry later
+    failed: list[str] = field(default_factory=list)
+
+
+async def _bisect_modify(
+    client: httpx.AsyncClient,
+    message_ids: list[str],
+    add_label_ids: list[str],
+    remove_label_ids: Optional[list[str]],
+) -> BatchLabelResult:
+    """
+    Label messages, splitting the batch in halves whenever Gmail rejects it
+    for a bad message ID, so the valid IDs are still labeled.
+    """
     try:
-        service.users().messages().modify(
-            userId='me',
-            id=message_id,
-            body=body
-        ).execute()
-        return True
-    except HttpError as e:
-        logger.error(f"Failed to modify message {message_id}: {e}")
-        return False
+        await _batch_modify_messages(client, message_ids, add_label_ids, remove_label_ids)
+        return BatchLabelResult(labeled=list(message_ids))
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code not in REJECTED_MESSAGE_STATUSES:
+            logger.error(f"Failed to modify {len(message_ids)} messages: {e}")
+            return BatchLabelResult(failed=list(message_ids))
+        if len(message_ids) == 1:
+            logger.warning(f"Gmail rejected message {message_ids[0]} ({e.response.status_code}), dropping it")
+            return BatchLabelResult(rejected=list(message_ids))
+    except httpx.HTTPError as e:
+        logger.error(f"Failed to modify {len(message_ids)} messages: {e}")
+        return BatchLabelResult(failed=list(message_ids))
+
+    middle = len(message_ids) // 2
+    result = BatchLabelResult()
+    for half in (message_ids[:middle], message_ids[middle:]):
+        part = await _bisect_modify(client, half, add_label_ids, remove_label_ids)
+        result.labeled.extend(part.labeled)
+        result.rejected.extend(part.rejected)
+        result.failed.extend(part.failed)
+    return result
+
+
+async def apply_labels_batch(
+    client: httpx.AsyncClient,
+    message_ids: list[str],
+    verdict: str,
+    move_to_spam: bool = False,
+    redis=None,
+) -> BatchLabelResult:
+    """
+    Apply the MailShield label for one verdict to a group of messages.
+    
+    Args:
+        client: Shared Gmail HTTP client
+        message_ids: Gmail message IDs sharing the same verdict
+        verdict: Security verdict ("malicious", "suspicious", "clean", "safe")
+        move_to_spam: If True, move messages to Spam (for malicious emails)
+        redis: Optional async Redis client for the cross-process label cache
+        
+    Returns:
+        BatchLabelResult splitting the IDs into labeled (including those that
+        already carried the label), rejected and failed
+    """
+    result = BatchLabelResult()
+
+    label_name = VERDICT_TO_LABEL.get(verdict.lower())
+    if not label_name:
+        logger.warning(f"Unknown verdict '{verdict}', defaulting to CAUTIOUS")
+        label_name = "MailShield/CAUTIOUS"
+
+    labeled_key = f"{LABELED_KEY_PREFIX}{label_name}"
+    if redis is not None and message_ids:
+        try:
+            already_labeled = await redis.smismember(labeled_key, message_ids)
+        except Exception as e:
+            logger.warning(f"Could not check labeled messages in Redis: {e}")
+            already_labeled = [False] * len(message_ids)
+        result.labeled = [m for m, done in zip(message_ids, already_labeled) if done]
+        message_ids = [m for m, done in zip(message_ids, already_labeled) if not done]
+        if not message_ids:
+            logger.info(f"All messages already carry '{label_name}', skipping")
+            return result
+
+    for start in range(0, len(message_ids), BATCH_MODIFY_LIMIT):
+        chunk = message_ids[start:start + BATCH_MODIFY_LIMIT]
+
+        # A cached label ID can go stale if the label is deleted in Gmail: on a
+        # rejection that labels.get confirms, drop it and retry once with a fresh lookup
+        for attempt in range(2):
+            # Get or create the label
+            label_id = await get_or_create_label(client, label_name, redis)
+            if not label_id:
+                logger.error(f"Could not get label ID for {label_name}")
+                result.failed.extend(message_ids[start:])
+                return result
+            
+            # Prepare label modifications
+            add_labels = [label_id]
+            remove_labels = []
+            
+            if move_to_spam:
+                # Get SPAM label ID (it's a system label, always exists)
+                add_labels.append("SPAM")
+                remove_labels.append("INBOX")
+            
+            # Apply modifications
+            try:
+                await _batch_modify_messages(
+                    client,
+                    chunk,
+                    add_labels,
+                    remove_labels if remove_labels else None
+                )
+                part = BatchLabelResult(labeled=chunk)
+            except httpx.HTTPStatusError as e:
+                status = e.response.status_code
+                if (
+                    attempt == 0
+                    and status in STALE_LABEL_STATUSES
+                    and not await _label_exists(client, label_id)
+                ):
+                    logger.warning(
+                        f"batchModify rejected ({status}) and label "
+                        f"'{label_name}' is gone, refreshing cached ID"
+                    )
+                    await invalidate_label(label_name, redis)
+                    continue
+                if status in REJECTED_MESSAGE_STATUSES:
+                    # One bad message ID fails the whole batch: isolate it
+                    logger.warning(
+                        f"batchModify rejected ({status}) for {len(chunk)} messages, "
+                        f"retrying in halves"
+                    )
+                    part = await _bisect_modify(
+                        client, chunk, add_labels, remove_labels if remove_labels else None
+                    )
+                else:
+                    logger.error(f"Failed to modify {len(chunk)} messages: {e}")
+                    part = BatchLabelResult(failed=chunk)
+            except httpx.HTTPError as e:
+                logger.error(f"Failed to modify {len(chunk)} messages: {e}")
+                part = BatchLabelResult(failed=chunk)
+
+            # Bookkeeping only: the labels are applied, so a Redis error must not fail the group
+            if redis is not None and part.labeled:
+                try:
+                    # One round-trip for the set update and its TTL
+                    async with redis.pipeline(transaction=False) as pipe:
+                        pipe.sadd(labeled_key, *part.labeled)
+                        pipe.expire(labeled_key, LABELED_TTL)
+                        await pipe.execute()
+                except Exception as e:
+                    logger.warning(f"Could not record {len(part.labeled)} labeled messages in Redis: {e}")
+
+            if part.labeled:
+                logger.info(
+                    f"Applied label '{label_name}' to {len(part.labeled)} messages",
+                    extra={"move_to_spam": move_to_spam}
+                )
+            result.labeled.extend(part.labeled)
+            result.rejected.extend(part.rejected)
+            result.failed.extend(part.failed)
+            break
+
+    return result
 
 
 async def apply_labels(
-    service: Resource,
+    client: httpx.AsyncClient,
     message_id: str,
     verdict: str,
-    move_to_spam: bool = False
+    move_to_spam: bool = False,
+    redis=None,
 ) -> bool:
     """
-    Apply the appropriate MailShield label based on verdict.
+    Apply the appropriate MailShield label to a single message.
     
     Args:
-        service: Gmail API service
+        client: Shared Gmail HTTP client
         message_id: Gmail message ID
         verdict: Security verdict ("malicious", "suspicious", "clean", "safe")
         move_to_spam: If True, move message to Spam (for malicious emails)
+        redis: Optional async Redis client for the cross-process label cache
         
     Returns:
         True on success, False on failure
     """
-    label_name = VERDICT_TO_LABEL.get(verdict.lower())
-    if not label_name:
-        logger.warning(f"Unknown verdict '{verdict}', defaulting to CAUTIOUS")
-        label_name = "MailShield/CAUTIOUS"
-    
-    # Get or create the label
-    label_id = await get_or_create_label(service, label_name)
-    if not label_id:
-        logger.error(f"Could not get label ID for {label_name}")
-        return False
-    
-    # Prepare label modifications
-    add_labels = [label_id]
-    remove_labels = []
-    
-    if move_to_spam:
-        # Get SPAM label ID (it's a system label, always exists)
-        add_labels.append("SPAM")
-        remove_labels.append("INBOX")
-    
-    # Apply modifications
-    loop = asyncio.get_running_loop()
-    success = await loop.run_in_executor(
-        None,
-        _modify_message_blocking,
-        service,
-        message_id,
-        add_labels,
-        remove_labels if remove_labels else None
-    )
-    
-    if success:
-        logger.info(
-            f"Applied label '{label_name}' to message {message_id}",
-            extra={"move_to_spam": move_to_spam}
-        )
-    
-    return success
+    result = await apply_labels_batch(client, [message_id], verdict, move_to_spam, redis)
+    return message_id in result.labeled
 
 
 def get_label_for_verdict(verdict: str) -> str:
@@ -19,27 +19,45 @@ import os
 import json
 import asyncio
 import random
+from dataclasses import dataclass
 from typing import Set, Optional
 from contextlib import asynccontextmanager
 
+import httpx
 from fastapi import FastAPI
 from pydantic import BaseModel
 import google.auth
-from googleapiclient.discovery import build
+from google.auth.transport.requests import Request
 from dotenv import load_dotenv
 
 import sys
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../..", ".."))
 from packages.shared.logger import setup_logging
-from packages.shared.queue import get_redis_client, FINAL_REPORT_QUEUE
-from gmail_labels import apply_labels, ensure_labels_exist, get_label_for_verdict
+from packages.shared.queue import claim_stale_entries, get_redis_client, FINAL_REPORT_QUEUE
+from gmail_labels import GMAIL_API_URL, BatchLabelResult, apply_labels_batch, ensure_labels_exist, get_label_for_verdict
 
 load_dotenv()
 
 # --- Configuration ---
 PORT = int(os.getenv("PORT", "9001"))
 MOVE_MALICIOUS_TO_SPAM = os.getenv("MOVE_MALICIOUS_TO_SPAM", "true").lower() == "true"
+CONSUMER_GROUP = "action_workers"
+
+# --- Stale Entry Recovery ---
+# Entries a consumer read but never acknowledged (crash, failed label group) for
+# CLAIM_MIN_IDLE_MS are reclaimed at startup and every CLAIM_INTERVAL seconds. The idle
+# threshold must stay well above LABEL_BATCH_WINDOW plus a batchModify round-trip.
+# Entries delivered more than MAX_DELIVERIES times go to the dead-letter stream.
+CLAIM_MIN_IDLE_MS = int(os.getenv("ACTION_CLAIM_MIN_IDLE_MS", "300000"))
+CLAIM_INTERVAL = int(os.getenv("ACTION_CLAIM_INTERVAL", "30"))
+MAX_DELIVERIES = int(os.getenv("ACTION_MAX_DELIVERIES", "5"))
+
+# --- Label Batching ---
+# Label requests are coalesced for up to LABEL_BATCH_WINDOW seconds (or until
+# LABEL_BATCH_MAX are queued) and applied with one batchModify per verdict
+LABEL_BATCH_MAX = int(os.getenv("LABEL_BATCH_MAX", "500"))
+LABEL_BATCH_WINDOW = float(os.getenv("LABEL_BATCH_WINDOW_MS", "500")) / 1000
 
 # --- Concurrency Control ---
 # Limit concurrent Gmail API calls to avoid rate limits
@@ -53,32 +71,173 @@ logger = setup_logging("action-worker")
 processed_messages: Set[str] = set()
 
 
-# --- Gmail Service ---
-def get_gmail_service():
+# --- Credential Cache ---
+# ADC credentials are resolved once and only refreshed when their access token
+# is about to expire, instead of paying an OAuth round-trip per message
+_credentials = None
+_credentials_lock = asyncio.Lock()
+
+
+def _load_credentials():
+    creds, _ = google.auth.default(
+        scopes=["https://www.googleapis.com/auth/gmail.modify"]
+    )
+    return creds
+
+
+async def get_credentials():
+    """
+    Return cached ADC credentials, refreshing the access token only when needed.
+    The lock coalesces concurrent refreshes into a single OAuth call.
+    """
+    global _credentials
+
+    async with _credentials_lock:
+        loop = asyncio.get_running_loop()
+        if _credentials is None:
+            _credentials = await loop.run_in_executor(None, _load_credentials)
+        if not _credentials.valid:
+            await loop.run_in_executor(None, _credentials.refresh, Request())
+            logger.info(f"Refreshed Gmail access token (expires {_credentials.expiry})")
+    return _credentials
+
+
+# --- Gmail HTTP Client ---
+class GmailAuth(httpx.Auth):
+    """Attaches the cached (and lazily refreshed) ADC access token to each request."""
+
+    async def async_auth_flow(self, request):
+        creds = await get_credentials()
+        request.headers["Authorization"] = f"Bearer {creds.token}"
+        yield request
+
+
+# One keep-alive connection pool shared by every Gmail call; created in lifespan
+gmail_client: Optional[httpx.AsyncClient] = None
+
+
+def create_gmail_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=GMAIL_API_URL,
+        auth=GmailAuth(),
+        timeout=httpx.Timeout(30.0),
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+    )
+
+
+# --- Label Queue ---
+@dataclass
+class LabelRequest:
+    message_id: str
+    verdict: str
+    move_to_spam: bool
+    stream_id: Optional[str] = None
+
+
+label_queue: "asyncio.Queue[LabelRequest]" = asyncio.Queue()
+
+
+async def _flush_label_group(
+    verdict: str, move_to_spam: bool, requests: list[LabelRequest], redis
+) -> list[str]:
     """
-    Falls back to ADC if available.
+    Apply one batchModify for a (verdict, move_to_spam) group.
+    
+    Returns:
+        Stream entry IDs to acknowledge (labeled or permanently rejected messages)
     """
+    message_ids = [r.message_id for r in requests]
     try:
-        creds, _ = google.auth.default(
-            scopes=["https://www.googleapis.com/auth/gmail.modify"]
-        )
-        return build("gmail", "v1", credentials=creds)
+        async with GMAIL_SEMAPHORE:
+            result = await apply_labels_batch(
+                client=gmail_client,
+                message_ids=message_ids,
+                verdict=verdict,
+                move_to_spam=move_to_spam,
+                redis=redis,
+            )
     except Exception as e:
-        logger.error(f"ADC authentication failed: {e}")
-        return None
+        logger.error(f"Batch labeling failed for {len(message_ids)} messages - {e}", exc_info=True)
+        result = BatchLabelResult(failed=message_ids)
+
+    if result.failed:
+        # Left unacknowledged: the reclaim loop redelivers them after CLAIM_MIN_IDLE_MS
+        logger.error(
+            f"Failed to apply labels to {len(result.failed)} messages - "
+            f"verdict={verdict} label={get_label_for_verdict(verdict)}"
+        )
+        processed_messages.difference_update(result.failed)
+
+    logger.info(
+        f"Action completed for {len(result.labeled)} messages - "
+        f"verdict={verdict} moved_to_spam={move_to_spam} rejected={len(result.rejected)}"
+    )
+    # Rejected IDs (deleted/invalid messages) can never succeed, so they are acknowledged too
+    done = set(result.labeled) | set(result.rejected)
+    return [r.stream_id for r in requests if r.stream_id and r.message_id in done]
+
+
+async def flush_label_batch(batch: list[LabelRequest], redis) -> None:
+    """
+    Apply one batchModify per (verdict, move_to_spam) group, running the
+    groups concurrently, and acknowledge the entries of the groups that succeeded.
+    """
+    groups: dict[tuple[str, bool], list[LabelRequest]] = {}
+    for request in batch:
+        groups.setdefault((request.verdict, request.move_to_spam), []).append(request)
+
+    results = await asyncio.gather(
+        *(
+            _flush_label_group(verdict, move_to_spam, requests, redis)
+            for (verdict, move_to_spam), requests in groups.items()
+        )
+    )
+
+    stream_ids = [stream_id for group_ids in results for stream_id in group_ids]
+    if stream_ids:
+        await redis.xack(FINAL_REPORT_QUEUE, CONSUMER_GROUP, *stream_ids)
+
+
+async def label_flush_loop() -> None:
+    """Drain the label queue in windows of LABEL_BATCH_WINDOW / LABEL_BATCH_MAX."""
+    redis = await get_redis_client()
+    loop = asyncio.get_running_loop()
+
+    while True:
+        batch = [await label_queue.get()]
+        deadline = loop.time() + LABEL_BATCH_WINDOW
+        while len(batch) < LABEL_BATCH_MAX:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(label_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        try:
+            await flush_label_batch(batch, redis)
+        except Exception as e:
+            logger.error(f"Label flush error: {e}")
 
 
 # --- Core Processing Logic ---
-async def process_action(message_id: str, sandbox_data: Optional[dict]) -> bool:
+async def process_action(
+    message_id: str, sandbox_data: Optional[dict], stream_id: Optional[str] = None
+) -> bool:
     """
-    Main processing logic for applying actions based on security verdict.
+    Determine the verdict for a message and queue its Gmail label change.
+    The stream entry is acknowledged by the flusher once the label is applied.
+    
+    Returns:
+        True if a label change was queued, False if the message was a duplicate
     """
     logger.info(f"Starting action processing for message {message_id}")
     
     # STEP 1: Idempotency check
     if message_id in processed_messages:
         logger.info(f"Message {message_id}: Already processed, skipping")
-        return True
+        return False
 
     processed_messages.add(message_id)
 
@@ -99,51 +258,83 @@ async def process_action(message_id: str, sandbox_data: Optional[dict]) -> bool:
     # Determine if we should move to spam
     move_to_spam = MOVE_MALICIOUS_TO_SPAM and final_verdict == "malicious"
 
-    # Apply Gmail labels
-    label_applied = get_label_for_verdict(final_verdict)
+    # STEP 3: Queue the label change for the next batchModify
+    await label_queue.put(LabelRequest(message_id, final_verdict, move_to_spam, stream_id))
+    logger.info(
+        f"Message {message_id}: Queued label {get_label_for_verdict(final_verdict)} "
+        f"(moved_to_spam={move_to_spam})"
+    )
+    return True
 
-    # STEP 3: Apply Gmail labels and actions
-    try:
-        async with GMAIL_SEMAPHORE:
-            service = get_gmail_service()
-            if not service:
-                logger.error(f"Message {message_id}: Failed to initialize Gmail service")
-                return False
-
-            success = await apply_labels(
-                service=service,
-                message_id=message_id,
-                verdict=final_verdict,
-                move_to_spam=move_to_spam,
-            )
 
-            if not success:
-                logger.error(
-                    f"Message {message_id}: Failed to apply labels - "
-                    f"verdict={final_verdict} label={label_applied}"
-                )
-                return False
+async def handle_entry(redis, msg_id: str, payload: dict) -> None:
+    """Queue the label change for one stream entry, acknowledging it if there is nothing to do."""
+    # Payload from Aggregator: {'job_id': ..., 'message_id': ..., 'intent': ..., 'sandbox': ...}
+    job_id = payload.get("job_id")
+    gmail_message_id = payload.get("message_id")
 
-    except Exception as e:
-        logger.error(
-            f"Message {message_id}: Gmail labeling failed - {e}", 
-            exc_info=True
-        )
-        return False
+    if not gmail_message_id:
+        logger.warning(f"Missing message_id in job {job_id}")
+        await redis.xack(FINAL_REPORT_QUEUE, CONSUMER_GROUP, msg_id)
+        return
+
+    sandbox_str = payload.get("sandbox")
+    sandbox_data = None
+    if sandbox_str:
+        try:
+            sandbox_data = json.loads(sandbox_str)
+        except:
+            pass
 
-    # STEP 4: Log completion for audit trail
     logger.info(
-        f"Message {message_id}: Action completed successfully - "
-        f"verdict={final_verdict} label={label_applied} moved_to_spam={move_to_spam}"
+        f"Processing action for message {gmail_message_id} (Job: {job_id})"
     )
-    return True
+
+    queued = await process_action(gmail_message_id, sandbox_data, msg_id)
+
+    if not queued:
+        await redis.xack(FINAL_REPORT_QUEUE, CONSUMER_GROUP, msg_id)
+        logger.debug("Acknowledged duplicate message %s", msg_id)
+
+
+async def claim_stale_messages(redis, consumer_name: str) -> int:
+    """
+    Take over entries left pending by crashed consumers or failed label groups.
+    
+    Returns:
+        Number of entries claimed
+    """
+    messages = await claim_stale_entries(
+        redis,
+        FINAL_REPORT_QUEUE,
+        CONSUMER_GROUP,
+        consumer_name,
+        min_idle_ms=CLAIM_MIN_IDLE_MS,
+        max_deliveries=MAX_DELIVERIES,
+    )
+    for msg_id, payload in messages:
+        await handle_entry(redis, msg_id, payload)
+
+    if messages:
+        logger.info(f"Reclaimed {len(messages)} stale messages from {FINAL_REPORT_QUEUE}")
+    return len(messages)
+
+
+async def reclaim_loop(redis, consumer_name: str) -> None:
+    """Periodically reclaim stale pending entries."""
+    while True:
+        await asyncio.sleep(CLAIM_INTERVAL)
+        try:
+            await claim_stale_messages(redis, consumer_name)
+        except Exception as e:
+            logger.error(f"Reclaim error: {e}")
 
 
 async def run_loop() -> None:
     """Main worker loop using Redis Streams Consumer Groups."""
     redis = await get_redis_client()
 
-    group_name = "action_workers"
+    group_name = CONSUMER_GROUP
     consumer_name = f"worker-{random.randint(1000, 9999)}"
 
     try:
@@ -157,74 +348,66 @@ async def run_loop() -> None:
 
     # Pre-create labels
     try:
-        service = get_gmail_service()
-        if service:
-            await ensure_labels_exist(service)
-            logger.info("✓ MailShield labels initialized")
+        await ensure_labels_exist(gmail_client, redis)
+        logger.info("✓ MailShield labels initialized")
     except Exception as e:
         logger.warning(f"Could not pre-create labels: {e}")
 
-    while True:
-        try:
-            streams = await redis.xreadgroup(
-                group_name,
-                consumer_name,
-                {FINAL_REPORT_QUEUE: ">"},
-                count=1,
-                block=5000,
-            )
-
-            if not streams:
-                continue
-
-            for _, messages in streams:
-                for msg_id, payload in messages:
-                    # Payload from Aggregator: {'job_id': ..., 'message_id': ..., 'intent': ..., 'sandbox': ...}
-                    job_id = payload.get("job_id")
-                    gmail_message_id = payload.get("message_id")
-
-                    if not gmail_message_id:
-                        logger.warning(f"Missing message_id in job {job_id}")
-                        await redis.xack(FINAL_REPORT_QUEUE, group_name, msg_id)
-                        continue
-
-                    sandbox_str = payload.get("sandbox")
-                    sandbox_data = None
-                    if sandbox_str:
-                        try:
-                            sandbox_data = json.loads(sandbox_str)
-                        except:
-                            pass
+    # Recover entries stranded by consumers that died before their labels were applied
+    try:
+        await claim_stale_messages(redis, consumer_name)
+    except Exception as e:
+        logger.warning(f"Startup reclaim failed: {e}")
+    reclaim_task = asyncio.create_task(reclaim_loop(redis, consumer_name))
 
-                    logger.info(
-                        f"Processing action for message {gmail_message_id} (Job: {job_id})"
-                    )
+    try:
+        while True:
+            try:
+                streams = await redis.xreadgroup(
+                    group_name,
+                    consumer_name,
+                    {FINAL_REPORT_QUEUE: ">"},
+                    count=1,
+                    block=5000,
+                )
 
-                    success = await process_action(gmail_message_id, sandbox_data)
+                if not streams:
+                    continue
 
-                    if success:
-                        await redis.xack(FINAL_REPORT_QUEUE, group_name, msg_id)
-                        logger.debug(f"Acknowledged message {msg_id}")
+                for _, messages in streams:
+                    for msg_id, payload in messages:
+                        await handle_entry(redis, msg_id, payload)
 
-        except Exception as e:
-            logger.error(f"Worker loop error: {e}")
-            await asyncio.sleep(1)
+            except Exception as e:
+                logger.error(f"Worker loop error: {e}")
+                await asyncio.sleep(1)
+    finally:
+        reclaim_task.cancel()
 
 
 # --- FastAPI App ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager to start background tasks."""
+    global gmail_client
+
     # Startup
-    task = asyncio.create_task(run_loop())
-    logger.info("Action Agent background task started")
+    gmail_client = create_gmail_client()
+    tasks = [
+        asyncio.create_task(run_loop()),
+        asyncio.create_task(label_flush_loop()),
+    ]
+    logger.info("Action Agent background tasks started")
     yield
     # Shutdown
-    task.cancel()
-    try:
-        await task
-    except asyncio.CancelledError:
-        pass
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    await gmail_client.aclose()
 
 
 app = FastAPI(
@@ -78,6 +78,159 @@ def test_label_cache_operations():
     print("✅ Label cache operations test passed")
 
 
+def test_invalidate_label():
+    from gmail_labels import _label_cache, invalidate_label, clear_label_cache
+    
+    clear_label_cache()
+    _label_cache["MailShield/SAFE"] = "stale-id"
+    _label_cache["MailShield/CAUTIOUS"] = "fresh-id"
+    
+    # Only the stale entry is dropped (no Redis client -> in-process cache only)
+    asyncio.run(invalidate_label("MailShield/SAFE"))
+    assert "MailShield/SAFE" not in _label_cache
+    assert _label_cache["MailShield/CAUTIOUS"] == "fresh-id"
+    
+    # Invalidating a missing label is a no-op
+    asyncio.run(invalidate_label("MailShield/SAFE"))
+    
+    clear_label_cache()
+    print("✅ Label invalidation test passed")
+
+
+def test_apply_labels_batch_chunks_requests():
+    import httpx
+    from gmail_labels import BATCH_MODIFY_LIMIT, _label_cache, apply_labels_batch, clear_label_cache
+    
+    bodies = []
+    
+    def handler(request):
+        bodies.append(json.loads(request.content))
+        return httpx.Response(204)
+    
+    async def run():
+        async with httpx.AsyncClient(
+            base_url="https://gmail.test", transport=httpx.MockTransport(handler)
+        ) as client:
+            return await apply_labels_batch(
+                client, [f"m{i}" for i in range(BATCH_MODIFY_LIMIT + 1)], "malicious", move_to_spam=True
+            )
+    
+    clear_label_cache()
+    _label_cache["MailShield/MALICIOUS"] = "label-1"
+    
+    # One batchModify per BATCH_MODIFY_LIMIT message IDs
+    result = asyncio.run(run())
+    assert len(result.labeled) == BATCH_MODIFY_LIMIT + 1
+    assert result.failed == [] and result.rejected == []
+    assert [len(b["ids"]) for b in bodies] == [BATCH_MODIFY_LIMIT, 1]
+    assert bodies[0]["addLabelIds"] == ["label-1", "SPAM"]
+    assert bodies[0]["removeLabelIds"] == ["INBOX"]
+    
+    clear_label_cache()
+    print("✅ Batch label chunking test passed")
+
+
+def test_rejected_modify_keeps_existing_label():
+    import httpx
+    from gmail_labels import _label_cache, apply_labels_batch, clear_label_cache
+    
+    requests = []
+    
+    def handler(request):
+        requests.append((request.method, request.url.path))
+        if request.url.path.endswith("/batchModify"):
+            return httpx.Response(400, json={"error": {"message": "Invalid id value"}})
+        # labels.get: the cached label still exists
+        return httpx.Response(200, json={"id": "label-1", "name": "MailShield/SAFE"})
+    
+    async def run():
+        async with httpx.AsyncClient(
+            base_url="https://gmail.test", transport=httpx.MockTransport(handler)
+        ) as client:
+            return await apply_labels_batch(client, ["bad-id"], "clean")
+    
+    clear_label_cache()
+    _label_cache["MailShield/SAFE"] = "label-1"
+    
+    result = asyncio.run(run())
+    
+    # A 400 caused by the message, not the label, must not evict the label ID
+    assert result.rejected == ["bad-id"]
+    assert _label_cache["MailShield/SAFE"] == "label-1"
+    assert ("GET", "/labels/label-1") in requests
+    assert ("GET", "/labels") not in requests
+    
+    clear_label_cache()
+    print("✅ Stale label confirmation test passed")
+
+
+def test_bad_message_id_does_not_fail_batch():
+    import httpx
+    from gmail_labels import _label_cache, apply_labels_batch, clear_label_cache
+    
+    def handler(request):
+        if request.url.path.endswith("/batchModify"):
+            ids = json.loads(request.content)["ids"]
+            if "gone" in ids:
+                return httpx.Response(404, json={"error": {"message": "Not Found"}})
+            return httpx.Response(204)
+        return httpx.Response(200, json={"id": "label-1"})
+    
+    async def run():
+        async with httpx.AsyncClient(
+            base_url="https://gmail.test", transport=httpx.MockTransport(handler)
+        ) as client:
+            return await apply_labels_batch(client, ["a", "b", "gone", "c", "d"], "clean")
+    
+    clear_label_cache()
+    _label_cache["MailShield/SAFE"] = "label-1"
+    
+    # The deleted message is isolated; every other message is still labeled
+    result = asyncio.run(run())
+    assert sorted(result.labeled) == ["a", "b", "c", "d"]
+    assert result.rejected == ["gone"]
+    assert result.failed == []
+    
+    clear_label_cache()
+    print("✅ Batch bisection test passed")
+
+
+def test_ensure_labels_exist_lists_once():
+    import httpx
+    from gmail_labels import MAILSHIELD_LABELS, _label_cache, clear_label_cache, ensure_labels_exist
+    
+    requests = []
+    
+    def handler(request):
+        requests.append((request.method, request.url.path))
+        if request.method == "GET":
+            return httpx.Response(200, json={"labels": [
+                {"id": "Label_1", "name": "MailShield/MALICIOUS"},
+                {"id": "INBOX", "name": "INBOX"},
+            ]})
+        name = json.loads(request.content)["name"]
+        return httpx.Response(200, json={"id": f"new-{name}"})
+    
+    async def run():
+        async with httpx.AsyncClient(
+            base_url="https://gmail.test", transport=httpx.MockTransport(handler)
+        ) as client:
+            return await ensure_labels_exist(client)
+    
+    clear_label_cache()
+    results = asyncio.run(run())
+    
+    # One list call, then only the missing labels are created
+    assert [m for m, _ in requests].count("GET") == 1
+    assert [m for m, _ in requests].count("POST") == len(MAILSHIELD_LABELS) - 1
+    assert results["MailShield/MALICIOUS"] == "Label_1"
+    assert set(results) == set(MAILSHIELD_LABELS)
+    assert _label_cache == results
+    
+    clear_label_cache()
+    print("✅ Label bootstrap test passed")
+
+
 def test_pydantic_models():
     from main import UnifiedDecisionPayload, SandboxResult, DecisionMetadata, ActionResult
     
@@ -153,6 +306,11 @@ if __name__ == "__main__":
     test_url_sanitization()
     test_mailshield_label_config()
     test_label_cache_operations()
+    test_invalidate_label()
+    test_apply_labels_batch_chunks_requests()
+    test_rejected_modify_keeps_existing_label()
+    test_bad_message_id_does_not_fail_batch()
+    test_ensure_labels_exist_lists_once()
     test_pydantic_models()
     test_payload_without_urls()
     test_gemini_json_response_parsing()
@@ -24,15 +24,15 @@ import asyncio
 import json
 import os
 import random
+import uuid
 from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 from typing import Any, Dict, Optional
 
 from fastapi import FastAPI
-from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from packages.shared.database import get_session, init_db
+from packages.shared.database import async_session_maker, init_db
 from packages.shared.constants import EmailStatus
 from packages.shared.models import EmailEvent
 from packages.shared.queue import (
@@ -66,7 +66,7 @@ async def save_state(redis, job_id: str, state: dict) -> None:
     await redis.hset(key, mapping=string_state)
     await redis.expire(key, STATE_TTL)
 
-    logger.debug(f"Job {job_id}: State saved to Redis (TTL={STATE_TTL}s)")
+    logger.debug("Job %s: State saved to Redis (TTL=%ss)", job_id, STATE_TTL)
 
 
 async def load_state(redis, job_id: str) -> dict | None:
@@ -78,7 +78,7 @@ async def load_state(redis, job_id: str) -> dict | None:
         logger.warning(f"Job {job_id}: No state found in Redis")
         return None
 
-    logger.debug(f"Job {job_id}: State loaded from Redis")
+    logger.debug("Job %s: State loaded from Redis", job_id)
     return state
 
 
@@ -86,7 +86,7 @@ async def delete_state(redis, job_id: str) -> None:
     """Delete job state from Redis."""
     key = f"{STATE_PREFIX}{job_id}"
     await redis.delete(key)
-    logger.debug(f"Job {job_id}: State deleted from Redis")
+    logger.debug("Job %s: State deleted from Redis", job_id)
 
 
 def is_job_complete(state: dict) -> bool:
@@ -98,15 +98,17 @@ def is_job_complete(state: dict) -> bool:
     if requires_b:
         complete = has_intent and has_sandbox
         logger.debug(
-            f"Job {state.get('job_id')}: Completion check (requiresB=true) - "
-            f"intent={has_intent} sandbox={has_sandbox} → {complete}"
+            "Job %s: Completion check (requiresB=true) - "
+            "intent=%s sandbox=%s → %s",
+            state.get('job_id'), has_intent, has_sandbox, complete,
         )
         return complete
     else:
         complete = has_intent
         logger.debug(
-            f"Job {state.get('job_id')}: Completion check (requiresB=false) - "
-            f"intent={has_intent} → {complete}"
+            "Job %s: Completion check (requiresB=false) - "
+            "intent=%s → %s",
+            state.get('job_id'), has_intent, complete,
         )
         return complete
 
@@ -230,27 +232,18 @@ async def finalize_job(redis, job_id: str, state: dict) -> None:
         )
 
         logger.debug(
-            f"Job {job_id}: Parsed results - "
-            f"has_intent={bool(intent_data)} has_sandbox={bool(sandbox_data)}"
+            "Job %s: Parsed results - "
+            "has_intent=%s has_sandbox=%s",
+            job_id, bool(intent_data), bool(sandbox_data),
         )
 
         # STEP 2: Update database with COMPLETED status
         gmail_message_id = None
 
-        @asynccontextmanager
-        async def session_scope():
-            async for s in get_session():
-                yield s
-                break
-
-        async with session_scope() as session:
+        async with async_session_maker() as session:
             try:
-                import uuid
-
                 email_id = uuid.UUID(job_id)
-                query = select(EmailEvent).where(EmailEvent.id == email_id)
-                result = await session.exec(query)
-                email = result.first()
+                email = await session.get(EmailEvent, email_id)
 
                 if not email:
                     logger.error(f"Job {job_id}: Email not found in database")
@@ -265,7 +258,6 @@ async def finalize_job(redis, job_id: str, state: dict) -> None:
 
                 session.add(email)
                 await session.commit()
-                await session.refresh(email)
 
                 logger.info(
                     f"Job {job_id}: Database updated - status=COMPLETED "
@@ -425,7 +417,8 @@ async def run_loop() -> None:
                 for message_id, payload in messages:
                     try:
                         logger.debug(
-                            f"Received message {message_id} from {stream_name}: {payload}"
+                            "Received message %s from %s: %s",
+                            message_id, stream_name, payload,
                         )
 
                         # Route to appropriate handler
@@ -440,7 +433,7 @@ async def run_loop() -> None:
 
                         # Acknowledge message after successful processing
                         await redis.xack(stream_name, group_name, message_id)
-                        logger.debug(f"Acknowledged {message_id} from {stream_name}")
+                        logger.debug("Acknowledged %s from %s", message_id, stream_name)
 
                     except Exception as msg_error:
                         logger.error(
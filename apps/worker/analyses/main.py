@@ -7,6 +7,7 @@ import os
 import random
 import uuid
 import logging
+import threading
 from datetime import datetime, timezone
 from typing import Any, Dict, Optional
 from contextlib import asynccontextmanager
@@ -14,13 +15,14 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
 import google.auth
+import httplib2
 import httpx
+from google_auth_httplib2 import AuthorizedHttp, Request as HttplibRequest
 from googleapiclient.discovery import build
 
-from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from packages.shared.database import get_session, init_db
+from packages.shared.database import async_session_maker, init_db
 from packages.shared.constants import EmailStatus
 from packages.shared.models import EmailEvent
 from packages.shared.queue import (
@@ -40,6 +42,9 @@ logger = setup_logging("analyses-worker")
 HA_API_KEY = os.getenv("HYBRID_ANALYSIS_API_KEY")
 USE_REAL_SANDBOX = os.getenv("USE_REAL_SANDBOX", "false").lower() == "true"
 HA_API_URL = "https://hybrid-analysis.com/api/v2"
+# Stream entries read per XREADGROUP and analysed concurrently, each with its
+# own DB session (keep it below DB_POOL_SIZE)
+BATCH_SIZE = int(os.getenv("ANALYSIS_BATCH_SIZE", "8"))
 
 # --- Concurrency Control ---
 GEMINI_SEMAPHORE = asyncio.Semaphore(2)  # Max 2 concurrent AI calls
@@ -61,17 +66,49 @@ async def analyze_urls_with_limit(urls: list[str]) -> tuple[str, str]:
         return await analyze_urls(urls)
 
 
+# --- Gmail Service Cache ---
+# The discovery-built resource and ADC credentials are created once per process.
+# httplib2 is not thread-safe, so each executor thread keeps its own AuthorizedHttp.
+_gmail_service: Any = None
+_gmail_credentials: Any = None
+_gmail_service_lock = threading.Lock()
+_gmail_http = threading.local()
+
+
 def get_gmail_service() -> Any:
-    """Builds and returns the Gmail API service."""
-    try:
-        creds, _ = google.auth.default(
-            scopes=["https://www.googleapis.com/auth/gmail.readonly"]
-        )
-        service = build("gmail", "v1", credentials=creds)
-        return service
-    except Exception as e:
-        logger.error(f"Failed to get Gmail service: {e}")
-        return None
+    """Builds (once) and returns the Gmail API service."""
+    global _gmail_service, _gmail_credentials
+
+    if _gmail_service is not None:
+        return _gmail_service
+
+    with _gmail_service_lock:
+        if _gmail_service is None:
+            try:
+                creds, _ = google.auth.default(
+                    scopes=["https://www.googleapis.com/auth/gmail.readonly"]
+                )
+                _gmail_service = build("gmail", "v1", credentials=creds, cache_discovery=False)
+                _gmail_credentials = creds
+            except Exception as e:
+                logger.error(f"Failed to get Gmail service: {e}")
+                return None
+    return _gmail_service
+
+
+def _authorized_http() -> AuthorizedHttp:
+    """Returns this executor thread's AuthorizedHttp, with a fresh access token."""
+    # Refresh under the lock so concurrent threads don't all refresh the shared credentials
+    if not _gmail_credentials.valid:
+        with _gmail_service_lock:
+            if not _gmail_credentials.valid:
+                _gmail_credentials.refresh(HttplibRequest(httplib2.Http()))
+
+    http = getattr(_gmail_http, "http", None)
+    if http is None:
+        http = AuthorizedHttp(_gmail_credentials, http=httplib2.Http())
+        _gmail_http.http = http
+    return http
 
 
 def fetch_attachment_from_gmail(message_id: str, attachment_id: str) -> bytes | None:
@@ -87,7 +124,7 @@ def fetch_attachment_from_gmail(message_id: str, attachment_id: str) -> bytes |
             .attachments()
             .get(userId="me", messageId=message_id, id=attachment_id)
         )
-        response = request.execute()
+        response = request.execute(http=_authorized_http())
         data = response.get("data")
         if not data:
             raise ValueError("No data found in attachment response")
@@ -360,8 +397,6 @@ async def process_email_analysis(
         email.updated_at = datetime.now(timezone.utc).replace(tzinfo=None)
         session.add(email)
         await session.commit()
-        await session.refresh(email)
-
 
         # STEP 4: Publish to EMAIL_ANALYSIS_DONE_QUEUE
         # GUARANTEE: verdict is likely definitive, but if Gemini failed ("unknown"), we send that too.
@@ -397,6 +432,52 @@ async def process_email_analysis(
         return False
 
 
+async def handle_message(redis, group_name: str, message_id: str, payload: dict) -> None:
+    """Analyse one stream entry in its own DB session and acknowledge it when done."""
+    email_id_str = payload.get("email_id")
+
+    if not email_id_str:
+        logger.warning(f"Invalid payload in message {message_id}")
+        await redis.xack(EMAIL_ANALYSIS_QUEUE, group_name, message_id)
+        return
+
+    try:
+        email_id = uuid.UUID(email_id_str)
+    except (ValueError, TypeError):
+        logger.error(
+            f"Malformed email ID '{email_id_str}' in message {message_id}"
+        )
+        await redis.xack(EMAIL_ANALYSIS_QUEUE, group_name, message_id)
+        return
+
+    logger.info(
+        f"Processing message {message_id} (Email ID: {email_id})"
+    )
+
+    processed_successfully = False
+
+    async with async_session_maker() as session:
+        try:
+            email = await session.get(EmailEvent, email_id)
+
+            if not email:
+                logger.warning(f"Email {email_id} not found.")
+                await redis.xack(
+                    EMAIL_ANALYSIS_QUEUE, group_name, message_id
+                )
+                return
+
+            processed_successfully = await process_email_analysis(
+                session, email, payload
+            )
+        except Exception as inner_e:
+            logger.error(f"Error processing {email_id}: {inner_e}")
+
+    if processed_successfully:
+        await redis.xack(EMAIL_ANALYSIS_QUEUE, group_name, message_id)
+        logger.info(f"Acknowledged message {message_id}")
+
+
 async def run_loop() -> None:
     """Main worker loop using Redis Streams Consumer Groups."""
     await init_db()
@@ -424,66 +505,25 @@ async def run_loop() -> None:
                 group_name,
                 consumer_name,
                 {EMAIL_ANALYSIS_QUEUE: ">"},
-                count=1,
+                count=BATCH_SIZE,
                 block=5000,
             )
 
             if not streams:
                 continue
 
+            # Entries are independent: overlap their Gmail, sandbox and DB round-trips
             for _, messages in streams:
-                for message_id, payload in messages:
-                    email_id_str = payload.get("email_id")
-
-                    if not email_id_str:
-                        logger.warning(f"Invalid payload in message {message_id}")
-                        await redis.xack(EMAIL_ANALYSIS_QUEUE, group_name, message_id)
-                        continue
-
-                    try:
-                        email_id = uuid.UUID(email_id_str)
-                    except (ValueError, TypeError):
-                        logger.error(
-                            f"Malformed email ID '{email_id_str}' in message {message_id}"
-                        )
-                        await redis.xack(EMAIL_ANALYSIS_QUEUE, group_name, message_id)
-                        continue
-
-                    logger.info(
-                        f"Processing message {message_id} (Email ID: {email_id})"
-                    )
-
-                    processed_successfully = False
-                    # yield session scope
-
-                    @asynccontextmanager
-                    async def session_scope():
-                        async for s in get_session():
-                            yield s
-                            break
-
-                    async with session_scope() as session:
-                        try:
-                            query = select(EmailEvent).where(EmailEvent.id == email_id)
-                            result = await session.exec(query)
-                            email = result.first()
-
-                            if not email:
-                                logger.warning(f"Email {email_id} not found.")
-                                await redis.xack(
-                                    EMAIL_ANALYSIS_QUEUE, group_name, message_id
-                                )
-                                continue
-
-                            processed_successfully = await process_email_analysis(
-                                session, email, payload
-                            )
-                        except Exception as inner_e:
-                            logger.error(f"Error processing {email_id}: {inner_e}")
-
-                    if processed_successfully:
-                        await redis.xack(EMAIL_ANALYSIS_QUEUE, group_name, message_id)
-                        logger.info(f"Acknowledged message {message_id}")
+                results = await asyncio.gather(
+                    *(
+                        handle_message(redis, group_name, message_id, payload)
+                        for message_id, payload in messages
+                    ),
+                    return_exceptions=True,
+                )
+                for (message_id, _), result in zip(messages, results):
+                    if isinstance(result, Exception):
+                        logger.error(f"Unhandled error for message {message_id}: {result}")
 
         except Exception as e:
             logger.error(f"Worker loop error: {e}")
@@ -1,4 +1,4 @@
-from langgraph.graph import StateGraph, END
+from langgraph.graph import StateGraph, START, END
 from apps.worker.intent.schemas import EmailIntentState
 from apps.worker.intent.nodes import analyze_subject, analyze_body, resolve_intent
 
@@ -9,10 +9,11 @@ def create_intent_graph():
     workflow.add_node("analyze_body", analyze_body)
     workflow.add_node("resolve_intent", resolve_intent)
     
-    workflow.set_entry_point("analyze_subject")
-    
-    workflow.add_edge("analyze_subject", "analyze_body")
-    workflow.add_edge("analyze_body", "resolve_intent")
+    # Subject and body are independent LLM calls: fan out so they run
+    # concurrently, and join before resolving
+    workflow.add_edge(START, "analyze_subject")
+    workflow.add_edge(START, "analyze_body")
+    workflow.add_edge(["analyze_subject", "analyze_body"], "resolve_intent")
     workflow.add_edge("resolve_intent", END)
     
     return workflow.compile()
@@ -1,22 +1,25 @@
 from __future__ import annotations
 
 import asyncio
-import json
+import hashlib
 import os
 import random
+import uuid
+from collections import OrderedDict
 from contextlib import asynccontextmanager
-from datetime import datetime, timezone
 
+import orjson
 from fastapi import FastAPI
 from sqlmodel import select
-from sqlmodel.ext.asyncio.session import AsyncSession
 
-from packages.shared.database import get_session, init_db
-from packages.shared.constants import EmailStatus, RiskTier
-from packages.shared.models import EmailEvent
-from packages.shared.queue import get_redis_client, EMAIL_INTENT_QUEUE, EMAIL_INTENT_DONE_QUEUE
+from packages.shared.database import async_session_maker, init_db
+from packages.shared.constants import EmailStatus, classify_risk
+from packages.shared.models import EmailEvent, utc_now
+from packages.shared.queue import claim_stale_entries, get_redis_client, EMAIL_INTENT_QUEUE, EMAIL_INTENT_DONE_QUEUE
 from packages.shared.logger import setup_logging
-from apps.worker.intent.taxonomy import Intent
+from apps.worker.intent.graph import intent_agent
+from apps.worker.intent.schemas import EmailIntentState
+from apps.worker.intent.taxonomy import INTENT_BY_VALUE, Intent
 
 # Configure logging
 logger = setup_logging('intent-worker')
@@ -45,45 +48,127 @@ RISK_MAPPING = {
 }
 
 
-def classify_risk(score: int) -> RiskTier:
-    if score < 30:
-        return RiskTier.SAFE
-    if score < 80:
-        return RiskTier.CAUTIOUS
-    return RiskTier.THREAT
+# Consumer group, read batch size and stale-entry recovery: entries pending for longer than
+# CLAIM_MIN_IDLE_MS are reclaimed at startup and every CLAIM_INTERVAL seconds. The idle
+# threshold must stay well above the worst-case batch time (BATCH_SIZE concurrent LLM
+# calls), or a live consumer's in-flight entries get processed twice. Entries delivered
+# more than MAX_DELIVERIES times go to the dead-letter stream.
+GROUP_NAME = 'intent_workers'
+BATCH_SIZE = int(os.getenv('INTENT_BATCH_SIZE', '16'))
+CLAIM_MIN_IDLE_MS = int(os.getenv('INTENT_CLAIM_MIN_IDLE_MS', '600000'))
+CLAIM_INTERVAL = int(os.getenv('INTENT_CLAIM_INTERVAL', '30'))
+MAX_DELIVERIES = int(os.getenv('INTENT_MAX_DELIVERIES', '5'))
 
+# Only the start of the body is classified; longer bodies are cut before
+# they enter the LangGraph state
+MAX_BODY = 2000
 
-async def process_email(
-    session: AsyncSession, email: EmailEvent, payload_subject: str = None, payload_body: str = None
-) -> bool:
-    """Process email for intent classification and publish results to DONE queue.
+# Classification results are cached per (subject, body) so duplicate traffic
+# (newsletters, automated notifications) skips the LLM entirely
+INTENT_CACHE_PREFIX = 'intent:cache:'
+INTENT_CACHE_TTL = 24 * 60 * 60
+# Hot results are also kept in a small in-process LRU in front of Redis
+INTENT_LOCAL_CACHE_SIZE = int(os.getenv('INTENT_LOCAL_CACHE_SIZE', '1024'))
+_local_cache: OrderedDict[str, tuple[Intent, float | None, list[str] | None]] = OrderedDict()
+
+
+def _remember_local(cache_key: str, result: tuple[Intent, float | None, list[str] | None]) -> None:
+    _local_cache[cache_key] = result
+    _local_cache.move_to_end(cache_key)
+    if len(_local_cache) > INTENT_LOCAL_CACHE_SIZE:
+        _local_cache.popitem(last=False)
+
+
+def intent_cache_key(subject: str, body: str) -> str:
+    """Redis key for the cached classification of an email's content."""
+    digest = hashlib.blake2b(f'{subject}\0{body}'.encode(), digest_size=16).hexdigest()
+    return f'{INTENT_CACHE_PREFIX}{digest}'
+
+
+async def classify_intent(state: EmailIntentState) -> tuple[Intent | None, float | None, list[str] | None]:
+    """Run the intent agent, reusing a cached result for identical content.
+
+    Results are looked up in the in-process LRU first, then in Redis. The Redis
+    cache is best-effort: its errors are logged and the agent runs as usual.
+
+    Returns:
+        (final_intent, final_confidence, final_indicators)
+    """
+    cache_key = intent_cache_key(state.subject, state.body)
+
+    local = _local_cache.get(cache_key)
+    if local is not None:
+        _local_cache.move_to_end(cache_key)
+        logger.debug('Local intent cache hit for %s', cache_key)
+        return local
+
+    redis = await get_redis_client()
+    try:
+        cached = await redis.get(cache_key)
+        if cached:
+            data = orjson.loads(cached)
+            logger.debug('Intent cache hit for %s', cache_key)
+            result = INTENT_BY_VALUE[data['intent']], data['confidence'], data['indicators']
+            _remember_local(cache_key, result)
+            return result
+    except Exception as e:
+        logger.warning(f'Intent cache lookup failed for {cache_key}: {e}')
+
+    # Invoke LangGraph
+    result = await intent_agent.ainvoke(state.dict())
+
+    final_intent = result.get('final_intent')
+    final_confidence = result.get('final_confidence')
+    final_indicators = result.get('final_indicators')
+
+    if final_intent:
+        _remember_local(cache_key, (final_intent, final_confidence, final_indicators))
+        try:
+            await redis.set(
+                cache_key,
+                orjson.dumps(
+                    {'intent': final_intent.value, 'confidence': final_confidence, 'indicators': final_indicators}
+                ),
+                ex=INTENT_CACHE_TTL,
+            )
+        except Exception as e:
+            logger.warning(f'Could not cache intent result for {cache_key}: {e}')
+
+    return final_intent, final_confidence, final_indicators
+
+
+def compute_risk_score(intent: Intent, confidence: float | None) -> int:
+    """Confidence-weighted risk score for a classified intent.
+
+    Low confidence pulls the intent's base score towards neutral (50);
+    high confidence keeps it at the base score.
+    """
+    confidence = confidence or 0.5
+    return int(RISK_MAPPING[intent] * confidence + 50 * (1 - confidence))
+
+
+async def process_email(email: EmailEvent, payload_subject: str = None, payload_body: str = None) -> bool:
+    """Classify an email's intent and apply the results to the loaded row.
+
+    Performs no database I/O: the caller commits the whole batch at once.
+    Results are only written to the row once classification and scoring have
+    succeeded; on failure the row is left untouched apart from status=FAILED.
 
     CRITICAL: This function NO LONGER sets status=COMPLETED.
     The Job Aggregator Service is responsible for final status updates.
     """
-    session.add(email)
-    await session.commit()
-    await session.refresh(email)
-
     logger.info(f'Starting intent processing for email_id={email.id} message_id={email.message_id}')
 
     try:
-        from apps.worker.intent.graph import intent_agent
-        from apps.worker.intent.schemas import EmailIntentState
-
         state = EmailIntentState(
             subject=payload_subject or email.subject or '',
-            body=payload_body or email.body_preview or '',
+            # Truncated once here so the graph state never carries the full body
+            body=(payload_body or email.body_preview or '')[:MAX_BODY],
         )
 
-        logger.debug(f'Email {email.id}: Invoking LangGraph intent agent')
-
-        # Invoke LangGraph
-        result = await intent_agent.ainvoke(state.dict())
+        logger.debug('Email %s: Invoking LangGraph intent agent', email.id)
 
-        final_intent = result.get('final_intent')
-        final_confidence = result.get('final_confidence')
-        final_indicators = result.get('final_indicators')
+        final_intent, final_confidence, final_indicators = await classify_intent(state)
 
         logger.info(
             f'Email {email.id}: Intent classification complete - '
@@ -91,76 +176,188 @@ async def process_email(
             f'confidence={(final_confidence if final_confidence else 0):.2f}'
         )
 
-        # Save to DB (convert Enum to string)
-        email.intent = final_intent.value if final_intent else None
-        email.intent_confidence = final_confidence
-        email.intent_indicators = final_indicators
-        email.intent_processed_at = datetime.now(timezone.utc).replace(tzinfo=None)
-
         # Use the Enum object for logic lookup
+        risk_score = risk_tier = None
         if final_intent and final_intent in RISK_MAPPING:
-            base_score = RISK_MAPPING[final_intent]
-            # Adjust score based on confidence
-            # If low confidence, pull towards neutral (50), if high confidence, stay at base
-            confidence = final_confidence or 0.5
-            risk_score = int(base_score * confidence + (50 * (1 - confidence)))
+            risk_score = compute_risk_score(final_intent, final_confidence)
+            risk_tier = classify_risk(risk_score)
 
-            email.risk_score = risk_score
-            email.risk_tier = (
-                RiskTier.SAFE if risk_score < 30 else (RiskTier.CAUTIOUS if risk_score < 80 else RiskTier.THREAT)
-            )
+            logger.info(f'Email {email.id}: Risk calculated - score={risk_score} tier={risk_tier.value}')
 
-            logger.info(f'Email {email.id}: Risk calculated - score={risk_score} tier={email.risk_tier.value}')
+        # Save to DB (convert Enum to string). Everything that can fail has run
+        # by now, so the row is never left half-updated when marked FAILED below.
+        email.intent = final_intent.value if final_intent else None
+        email.intent_confidence = final_confidence
+        email.intent_indicators = final_indicators
+        email.intent_processed_at = utc_now()
+        if risk_score is not None:
+            email.risk_score = risk_score
+            email.risk_tier = risk_tier
 
         # CRITICAL CHANGE: Do NOT set status=COMPLETED
         # Status will be set by Job Aggregator after all workers complete
         # email.status = EmailStatus.COMPLETED  <-- REMOVED
 
-        # Commit changes to database
-        session.add(email)
-        await session.commit()
-        await session.refresh(email)  # Refresh prevents 'greenlet_spawn' error on attribute access
-
-        logger.debug(f'Email {email.id}: Database updated with intent analysis results')
-
-        # CRITICAL: Publish to DONE queue for Job Aggregator
-        redis = await get_redis_client()
-        done_payload = {
-            'job_id': str(email.id),
-            'intent': email.intent or 'UNKNOWN',
-            'risk_score': email.risk_score or 0,
-            'risk_tier': email.risk_tier.value if email.risk_tier else None,
-            'intent_confidence': email.intent_confidence or 0.0,
-            'intent_indicators': json.dumps(email.intent_indicators or []),
-        }
-        await redis.xadd(EMAIL_INTENT_DONE_QUEUE, done_payload)
-
-        logger.info(
-            f'Email {email.id}: Published intent results to DONE queue '
-            f'(intent={email.intent}, risk_score={email.risk_score})'
-        )
-
         return True
 
     except Exception as e:
         logger.error(f'Error in process_email for {email.id}: {e}', exc_info=True)
-        try:
-            await session.rollback()  # Rollback the failed transaction so we can use the session again
-            email.status = EmailStatus.FAILED
-            session.add(email)
-            await session.commit()
-            logger.warning(f'Email {email.id}: Marked as FAILED after processing error')
-        except Exception as commit_err:
-            logger.error(f'Failed to persist FAILED status for {email.id}: {commit_err}')
+        email.status = EmailStatus.FAILED
+        logger.warning(f'Email {email.id}: Marked as FAILED after processing error')
         return False
 
 
+def build_done_payload(email: EmailEvent) -> dict:
+    """DONE queue payload for the Job Aggregator (built before commit expires the row)."""
+    return {
+        'job_id': str(email.id),
+        'intent': email.intent or 'UNKNOWN',
+        'risk_score': email.risk_score or 0,
+        'risk_tier': email.risk_tier.value if email.risk_tier else None,
+        'intent_confidence': email.intent_confidence or 0.0,
+        'intent_indicators': orjson.dumps(email.intent_indicators or []),
+    }
+
+
+async def publish_done_batch(redis, batch: list[dict]) -> None:
+    """Publish DONE payloads with one pipelined round-trip."""
+    async with redis.pipeline(transaction=False) as pipe:
+        for done_payload in batch:
+            pipe.xadd(EMAIL_INTENT_DONE_QUEUE, done_payload)
+        await pipe.execute()
+
+
+def parse_email_id(message_id: str, payload: dict) -> uuid.UUID | None:
+    """Extract the email UUID from a stream entry, or None if the entry is unusable."""
+    email_id_str = payload.get('email_id') if payload else None
+
+    if not email_id_str:
+        logger.warning(f'Invalid payload in message {message_id}')
+        return None
+
+    try:
+        return uuid.UUID(email_id_str)
+    except (ValueError, TypeError):
+        logger.error(f'Malformed email ID {email_id_str!r} in message {message_id}')
+        return None
+
+
+async def process_batch(redis, messages: list) -> None:
+    """Process a batch of stream entries with one DB session and one commit.
+
+    Emails are classified concurrently; finished entries are acknowledged with a
+    single XACK once the batch is committed and its DONE payloads are published.
+    """
+    acks = []
+    jobs = []
+    for message_id, payload in messages:
+        email_id = parse_email_id(message_id, payload)
+        if email_id is None:
+            acks.append(message_id)
+            continue
+        jobs.append((message_id, email_id, payload.get('subject'), payload.get('body')))
+
+    if jobs:
+        try:
+            async with async_session_maker() as session:
+                # One IN query for the whole batch instead of a lookup per entry
+                result = await session.exec(
+                    select(EmailEvent).where(EmailEvent.id.in_({email_id for _, email_id, _, _ in jobs}))
+                )
+                by_id = {email.id: email for email in result.all()}
+
+                loaded = []
+                for message_id, email_id, subject, body in jobs:
+                    email = by_id.get(email_id)
+                    if not email:
+                        logger.warning(f'Email {email_id} not found.')
+                        # Acknowledge message if email is not found to prevent redelivery
+                        acks.append(message_id)
+                        continue
+                    logger.info(f'Processing message {message_id} (Email ID: {email_id})')
+                    loaded.append((message_id, email, subject, body))
+
+                results = await asyncio.gather(
+                    *(process_email(email, subject, body) for _, email, subject, body in loaded),
+                    return_exceptions=True,
+                )
+
+                succeeded = []
+                done_payloads = []
+                for (message_id, email, _, _), result in zip(loaded, results):
+                    if isinstance(result, Exception):
+                        logger.error(f'Unhandled error for message {message_id}: {result}')
+                    elif result:
+                        succeeded.append(message_id)
+                        done_payloads.append(build_done_payload(email))
+
+                # One commit for every email in the batch (FAILED statuses included)
+                try:
+                    await session.commit()
+                except Exception:
+                    await session.rollback()
+                    raise
+        except Exception as e:
+            # Nothing from this batch is acknowledged, so every entry is redelivered
+            logger.error(f'Failed to persist intent batch of {len(jobs)} emails: {e}')
+        else:
+            logger.debug('Database updated with intent results for %s emails', len(succeeded))
+            # CRITICAL: Publish to DONE queue for Job Aggregator before acknowledging.
+            # If the publish fails the entries stay pending and are reclaimed, so an
+            # acknowledged email always has its DONE payload in the stream.
+            try:
+                if done_payloads:
+                    await publish_done_batch(redis, done_payloads)
+                    logger.debug('Published %s intent results to DONE queue', len(done_payloads))
+            except Exception as e:
+                logger.error(f'Failed to publish {len(done_payloads)} DONE payloads: {e}')
+            else:
+                acks.extend(succeeded)
+
+    if acks:
+        # XACK takes any number of IDs: one command acknowledges the whole batch
+        await redis.xack(EMAIL_INTENT_QUEUE, GROUP_NAME, *acks)
+        logger.info(f'Acknowledged {len(acks)}/{len(messages)} messages')
+
+
+async def claim_stale_messages(redis, consumer_name: str) -> int:
+    """Take over entries left pending by crashed consumers and process them.
+
+    Returns:
+        Number of entries claimed
+    """
+    messages = await claim_stale_entries(
+        redis,
+        EMAIL_INTENT_QUEUE,
+        GROUP_NAME,
+        consumer_name,
+        min_idle_ms=CLAIM_MIN_IDLE_MS,
+        max_deliveries=MAX_DELIVERIES,
+    )
+    for start in range(0, len(messages), BATCH_SIZE):
+        await process_batch(redis, messages[start:start + BATCH_SIZE])
+
+    if messages:
+        logger.info(f'Reclaimed {len(messages)} stale messages from {EMAIL_INTENT_QUEUE}')
+    return len(messages)
+
+
+async def reclaim_loop(redis, consumer_name: str) -> None:
+    """Periodically reclaim stale pending entries."""
+    while True:
+        await asyncio.sleep(CLAIM_INTERVAL)
+        try:
+            await claim_stale_messages(redis, consumer_name)
+        except Exception as e:
+            logger.error(f'Reclaim error: {e}')
+
+
 async def run_loop() -> None:
     """Main worker loop using Redis Streams Consumer Groups."""
     await init_db()
     redis = await get_redis_client()
 
-    group_name = 'intent_workers'
+    group_name = GROUP_NAME
     consumer_name = f'worker-{random.randint(1000, 9999)}'
 
     # Create consumer group if it doesn't exist
@@ -173,67 +370,36 @@ async def run_loop() -> None:
 
     logger.info(f'Worker {consumer_name} started. Listening on {EMAIL_INTENT_QUEUE}...')
 
-    while True:
-        try:
-            # Read from group
-            # Count=1, block=5000ms
-            streams = await redis.xreadgroup(
-                group_name,
-                consumer_name,
-                {EMAIL_INTENT_QUEUE: '>'},
-                count=1,
-                block=5000,
-            )
-
-            if not streams:
-                continue
-
-            for stream_name, messages in streams:
-                for message_id, payload in messages:
-                    email_id_str = payload.get('email_id')
-                    payload_subject = payload.get('subject')
-                    payload_body = payload.get('body')
-
-                    if not email_id_str:
-                        logger.warning(f'Invalid payload in message {message_id}')
-                        await redis.xack(EMAIL_INTENT_QUEUE, group_name, message_id)
-                        continue
-
-                    logger.info(f'Processing message {message_id} (Email ID: {email_id_str})')
-
-                    processed_successfully = False
-                    # Use async context manager for session to avoid leaks and handle errors better
-                    from contextlib import asynccontextmanager
-
-                    @asynccontextmanager
-                    async def session_scope():
-                        async for s in get_session():
-                            yield s
-                            break
-
-                    async with session_scope() as session:
-                        try:
-                            query = select(EmailEvent).where(EmailEvent.id == email_id_str)
-                            result = await session.exec(query)
-                            email = result.first()
-
-                            if not email:
-                                logger.warning(f'Email {email_id_str} not found.')
-                                # Acknowledge message if email is not found to prevent redelivery
-                                await redis.xack(EMAIL_INTENT_QUEUE, group_name, message_id)
-                                continue
-
-                            processed_successfully = await process_email(session, email, payload_subject, payload_body)
-                        except Exception as inner_e:
-                            logger.error(f'Error processing {email_id_str}: {inner_e}')
-
-                    if processed_successfully:
-                        await redis.xack(EMAIL_INTENT_QUEUE, group_name, message_id)
-                        logger.info(f'Acknowledged message {message_id}')
+    # Recover entries stranded by consumers that died mid-processing
+    try:
+        await claim_stale_messages(redis, consumer_name)
+    except Exception as e:
+        logger.warning(f'Startup reclaim failed: {e}')
+    reclaim_task = asyncio.create_task(reclaim_loop(redis, consumer_name))
 
-        except Exception as e:
-            logger.error(f'Worker loop error: {e}')
-            await asyncio.sleep(1)
+    try:
+        while True:
+            try:
+                # Read up to BATCH_SIZE entries, block=5000ms
+                streams = await redis.xreadgroup(
+                    group_name,
+                    consumer_name,
+                    {EMAIL_INTENT_QUEUE: '>'},
+                    count=BATCH_SIZE,
+                    block=5000,
+                )
+
+                if not streams:
+                    continue
+
+                for stream_name, messages in streams:
+                    await process_batch(redis, messages)
+
+            except Exception as e:
+                logger.error(f'Worker loop error: {e}')
+                await asyncio.sleep(1)
+    finally:
+        reclaim_task.cancel()
 
 
 # Create lifespan context manager
@@ -241,15 +407,19 @@ async def run_loop() -> None:
 async def lifespan(app: FastAPI):
     """Lifespan context manager to start background tasks."""
     # Startup
-    task = asyncio.create_task(run_loop())
-    logger.info('Intent worker background task started')
+    tasks = [
+        asyncio.create_task(run_loop()),
+    ]
+    logger.info('Intent worker background tasks started')
     yield
     # Shutdown
-    task.cancel()
-    try:
-        await task
-    except asyncio.CancelledError:
-        pass
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
 
 
 app = FastAPI(lifespan=lifespan)
@@ -1,14 +1,27 @@
 import logging
 import os
+from functools import lru_cache
+from itertools import chain
 from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.messages import SystemMessage
 from langchain_core.prompts import ChatPromptTemplate
 from apps.worker.intent.schemas import EmailIntentState, IntentAnalysis
-from apps.worker.intent.prompts import SYSTEM_PROMPT, SUBJECT_PROMPT, BODY_PROMPT
-from apps.worker.intent.taxonomy import Intent
+from apps.worker.intent.prompts import SYSTEM_PROMPT_RENDERED, SUBJECT_PROMPT, BODY_PROMPT
 
 logger = logging.getLogger(__name__)
 
 
+# Built once per process. The pre-rendered system prompt is passed as a literal
+# message, so it is not re-formatted on every call and always comes first.
+SUBJECT_TEMPLATE = ChatPromptTemplate.from_messages(
+    [SystemMessage(content=SYSTEM_PROMPT_RENDERED), ("user", SUBJECT_PROMPT)]
+)
+BODY_TEMPLATE = ChatPromptTemplate.from_messages(
+    [SystemMessage(content=SYSTEM_PROMPT_RENDERED), ("user", BODY_PROMPT)]
+)
+
+
+@lru_cache(maxsize=1)
 def get_model():
     api_key = os.environ.get("GOOGLE_API_KEY")
     if not api_key:
@@ -21,22 +34,23 @@ def get_model():
     )
 
 
+# Chains are created lazily (GOOGLE_API_KEY may be set after import) and then
+# shared, so subject and body calls reuse one model client
+@lru_cache(maxsize=1)
+def get_subject_chain():
+    return SUBJECT_TEMPLATE | get_model().with_structured_output(IntentAnalysis)
+
+
+@lru_cache(maxsize=1)
+def get_body_chain():
+    return BODY_TEMPLATE | get_model().with_structured_output(IntentAnalysis)
+
+
 async def analyze_subject(state: EmailIntentState) -> dict:
     """Analyze email subject to determine intent."""
     logger.info(f"Analyzing subject: {state.subject[:50]}...")
     
-    model = get_model().with_structured_output(IntentAnalysis)
-
-    intents_list = "\n".join([f"- {i.value}" for i in Intent])
-
-    prompt = ChatPromptTemplate.from_messages(
-        [("system", SYSTEM_PROMPT), ("user", SUBJECT_PROMPT)]
-    )
-
-    chain = prompt | model
-    result = await chain.ainvoke(
-        {"intents_list": intents_list, "subject": state.subject}
-    )
+    result = await get_subject_chain().ainvoke({"subject": state.subject})
     
     logger.info(f"Subject analysis result: intent={result.intent}, confidence={result.confidence}")
 
@@ -49,20 +63,11 @@ async def analyze_subject(state: EmailIntentState) -> dict:
 
 async def analyze_body(state: EmailIntentState) -> dict:
     """Analyze email body to determine intent."""
-    # Truncate body if too long
-    body = state.body[:2000]
-    logger.info(f"Analyzing body (length={len(state.body)}, truncated={len(body)})")
-
-    model = get_model().with_structured_output(IntentAnalysis)
-
-    intents_list = "\n".join([f"- {i.value}" for i in Intent])
-
-    prompt = ChatPromptTemplate.from_messages(
-        [("system", SYSTEM_PROMPT), ("user", BODY_PROMPT)]
-    )
+    # The producer truncates the body before building the state
+    body = state.body
+    logger.info(f"Analyzing body (length={len(body)})")
 
-    chain = prompt | model
-    result = await chain.ainvoke({"intents_list": intents_list, "body": body})
+    result = await get_body_chain().ainvoke({"body": body})
     
     logger.info(f"Body analysis result: intent={result.intent}, confidence={result.confidence}")
 
@@ -81,9 +86,9 @@ def resolve_intent(state: EmailIntentState) -> dict:
     
     # Logic for merging subject and body intent
     if state.subject_intent == state.body_intent:
-        # Merge unique indicators
+        # Merge unique indicators, keeping first-seen order
         combined_indicators = list(
-            set((state.subject_indicators or []) + (state.body_indicators or []))
+            dict.fromkeys(chain(state.subject_indicators or (), state.body_indicators or ()))
         )
         result = {
             "final_intent": state.subject_intent,
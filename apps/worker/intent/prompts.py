@@ -41,3 +41,9 @@ Body:
 {body}
 \"\"\"
 """
+
+# The intent list is fixed, so the system prompt is rendered once at import.
+# Sending a byte-identical system prefix on every call also lets the provider
+# reuse its prompt cache.
+INTENTS_LIST = "\n".join(f"- {i.value}" for i in Intent)
+SYSTEM_PROMPT_RENDERED = SYSTEM_PROMPT.format(intents_list=INTENTS_LIST)
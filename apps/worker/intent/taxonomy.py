@@ -18,3 +18,8 @@ class Intent(str, Enum):
     BEC_FRAUD = "bec_fraud"
     RECONNAISSANCE = "reconnaissance"
     UNKNOWN = "unknown"
+
+
+# Value -> member table for decoding cached results without going through
+# the Enum constructor
+INTENT_BY_VALUE: dict[str, Intent] = {i.value: i for i in Intent}
@@ -1,4 +1,5 @@
 import enum
+from bisect import bisect_right
 
 class EmailStatus(str, enum.Enum):
     """Status of email analysis processing."""
@@ -16,6 +17,18 @@ class RiskTier(str, enum.Enum):
     THREAT = "THREAT"
 
 
+# Risk tier boundaries: score < 30 is SAFE, < 80 is CAUTIOUS, otherwise THREAT
+_RISK_TIER_CUTS = (30, 80)
+_RISK_TIERS = (RiskTier.SAFE, RiskTier.CAUTIOUS, RiskTier.THREAT)
+# Tier for every score in 0-100, precomputed so classification is a single index
+_RISK_TIER_BY_SCORE = tuple(_RISK_TIERS[bisect_right(_RISK_TIER_CUTS, score)] for score in range(101))
+
+
+def classify_risk(score: int) -> RiskTier:
+    """Map a 0-100 risk score to its tier (out-of-range scores are clamped)."""
+    return _RISK_TIER_BY_SCORE[min(max(score, 0), 100)]
+
+
 class ThreatCategory(str, enum.Enum):
     """Category of detected threat."""
     NONE = "NONE"
@@ -4,7 +4,8 @@ import os
 from collections.abc import AsyncGenerator
 
 from dotenv import load_dotenv
-from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
 from sqlmodel import SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession
 
@@ -25,21 +26,64 @@ if not (DATABASE_URL.startswith("postgresql+asyncpg://") or DATABASE_URL.startsw
     )
 
 # GCP Cloud SQL PostgreSQL configuration
-# Using default AsyncAdaptedQueuePool (as recommended by CodeRabbit)
+# DB_POOL_MODE=direct (default) keeps the AsyncAdaptedQueuePool (as recommended by
+# CodeRabbit), sized for batched workers: keep DB_POOL_SIZE around 2x the worker
+# batch size so concurrent coroutines don't stall waiting for a connection.
+# Pre-ping drops connections Cloud SQL closed while idle; recycle bounds their age.
+# DB_POOL_TIMEOUT caps how long a request waits for a free connection before failing.
+# DB_POOL_MODE=pgbouncer leaves pooling to PgBouncer (transaction mode): each
+# container holds no idle connections, so autoscaling can't exhaust Cloud SQL.
+DB_POOL_MODE = os.getenv("DB_POOL_MODE", "direct").lower()
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+if DB_POOL_MODE not in ("direct", "pgbouncer"):
+    raise RuntimeError("Invalid DB_POOL_MODE. Use 'direct' or 'pgbouncer'.")
+
+engine_options = {}
+if DATABASE_URL.startswith("postgresql+asyncpg://"):
+    if DB_POOL_MODE == "pgbouncer":
+        engine_options = {
+            "poolclass": NullPool,
+            # Server-side prepared statements can't be reused across
+            # PgBouncer transactions
+            "connect_args": {"statement_cache_size": 0},
+        }
+    else:
+        engine_options = {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_pre_ping": True,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pool_timeout": DB_POOL_TIMEOUT,
+        }
+
 engine = create_async_engine(
     DATABASE_URL,
     echo=False,
     future=True,
+    **engine_options,
 )
 
+# Session factory for workers that open sessions outside FastAPI dependencies.
+# Instances keep their loaded values after commit, so reading them back
+# doesn't need a refresh() round-trip (lazy reloads aren't possible in async).
+async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
 
 async def init_db() -> None:
-    """Create database tables if they do not exist."""
+    """
+    Create database tables if they do not exist.
+
+    Workers must await this before any task takes a connection from the pool.
+    """
     async with engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
 
 
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
     """Yield an async database session."""
-    async with AsyncSession(engine) as session:
+    async with async_session_maker() as session:
         yield session
@@ -8,7 +8,7 @@ from datetime import datetime, timezone
 from typing import Optional
 
 from sqlalchemy import DateTime
-from sqlmodel import JSON, Column, Enum, Field, SQLModel
+from sqlmodel import JSON, Column, Enum, Field, Index, SQLModel
 
 
 from .constants import EmailStatus, RiskTier, ThreatCategory
@@ -39,6 +39,14 @@ class EmailEvent(SQLModel, table=True):
     """Email event model - represents an analyzed email."""
 
     __tablename__ = "email_events"
+    __table_args__ = (
+        # Covers the per-user GROUP BY risk_tier behind /api/stats
+        Index("ix_email_events_user_id_risk_tier", "user_id", "risk_tier"),
+        # /api/emails lists newest first; a backward scan serves ORDER BY ... DESC
+        Index("ix_email_events_user_id_received_at", "user_id", "received_at"),
+        # /api/emails?status_filter=...
+        Index("ix_email_events_user_id_status", "user_id", "status"),
+    )
 
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True, index=True)
     user_id: uuid.UUID = Field(foreign_key="users.id", index=True)
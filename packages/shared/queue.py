@@ -15,6 +15,9 @@ EMAIL_INTENT_DONE_QUEUE = 'emails:intent:done'
 EMAIL_ANALYSIS_DONE_QUEUE = 'emails:analysis:done'
 FINAL_REPORT_QUEUE = 'job:completed'
 
+# Entries that keep failing are moved to '<stream>:dead' instead of being retried forever
+DEAD_LETTER_SUFFIX = ':dead'
+
 # Singleton state
 _redis_client: Optional[Redis] = None
 _redis_lock = asyncio.Lock()
@@ -30,6 +33,9 @@ async def get_redis_client() -> Redis:
     Get a singleton async Redis client.
 
     This is concurrency-safe and guarantees only one client instance.
+    The client is created with decode_responses=True, so stream payloads and
+    values arrive as str (decoded once by redis-py) and callers must not
+    call .decode() on them.
     """
     global _redis_client
 
@@ -52,3 +58,80 @@ async def close_redis() -> None:
     if _redis_client is not None:
         await _redis_client.aclose()
         _redis_client = None
+
+
+def dead_letter_stream(stream: str) -> str:
+    """Name of the dead-letter stream for a work queue."""
+    return f'{stream}{DEAD_LETTER_SUFFIX}'
+
+
+async def claim_stale_entries(
+    redis: Redis,
+    stream: str,
+    group: str,
+    consumer: str,
+    *,
+    min_idle_ms: int,
+    max_deliveries: int,
+    count: int = 100,
+) -> list[tuple[str, dict]]:
+    """
+    Claim entries another consumer left pending (XAUTOCLAIM) for reprocessing.
+
+    Entries already delivered more than max_deliveries times are copied to the
+    stream's dead-letter stream and acknowledged instead of being returned, so a
+    poison message is not retried forever. Entries deleted from the stream are
+    simply acknowledged.
+
+    Args:
+        redis: Async Redis client
+        stream: Work queue stream name
+        group: Consumer group name
+        consumer: Consumer that takes ownership of the claimed entries
+        min_idle_ms: Only claim entries idle for at least this long
+        max_deliveries: Delivery attempts before an entry is dead-lettered
+        count: Entries per XAUTOCLAIM page
+
+    Returns:
+        (entry_id, payload) pairs to process
+    """
+    claimed: list[tuple[str, dict]] = []
+    start_id = '0-0'
+    while True:
+        start_id, messages, *_ = await redis.xautoclaim(
+            stream,
+            group,
+            consumer,
+            min_idle_time=min_idle_ms,
+            start_id=start_id,
+            count=count,
+        )
+
+        if messages:
+            # XAUTOCLAIM bumps the delivery counter; read it back per entry
+            async with redis.pipeline(transaction=False) as pipe:
+                for entry_id, _ in messages:
+                    pipe.xpending_range(stream, group, min=entry_id, max=entry_id, count=1)
+                pending = await pipe.execute()
+
+            async with redis.pipeline(transaction=False) as pipe:
+                dropped = 0
+                for (entry_id, payload), info in zip(messages, pending):
+                    deliveries = info[0]['times_delivered'] if info else 0
+                    if payload and deliveries <= max_deliveries:
+                        claimed.append((entry_id, payload))
+                        continue
+                    if payload:
+                        pipe.xadd(
+                            dead_letter_stream(stream),
+                            {**payload, 'source_id': entry_id, 'deliveries': deliveries},
+                        )
+                    pipe.xack(stream, group, entry_id)
+                    dropped += 1
+                if dropped:
+                    await pipe.execute()
+
+        if start_id == '0-0':
+            break
+
+    return claimed
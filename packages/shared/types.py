@@ -1,4 +1,4 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from pydantic import BaseModel, Field
 from typing import Optional
 from datetime import datetime
@@ -124,8 +124,6 @@ class WatchInfo(BaseModel):
     @property
     def expires_soon(self) -> bool:
         """Check if watch expires within 24 hours (should renew)."""
-        from datetime import timedelta
-
         return datetime.now(timezone.utc) >= (self.expiration_datetime - timedelta(hours=24))
 
 
@@ -49,6 +49,13 @@ async def migrate():
         # usage of 'IF NOT EXISTS' for enum values requires newer Postgres or DO block, 
         # but simpler to just run it and ignore error if already exists (handled by loop below)
         "ALTER TYPE email_status_enum ADD VALUE IF NOT EXISTS 'SPAM'",
+        
+        # Per-user risk tier counts for /api/stats
+        "CREATE INDEX IF NOT EXISTS ix_email_events_user_id_risk_tier ON email_events (user_id, risk_tier)",
+        
+        # Email listing: newest first, optionally filtered by status
+        "CREATE INDEX IF NOT EXISTS ix_email_events_user_id_received_at ON email_events (user_id, received_at)",
+        "CREATE INDEX IF NOT EXISTS ix_email_events_user_id_status ON email_events (user_id, status)",
     ]
     
     async with engine.begin() as conn: